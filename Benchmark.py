@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# Times seed generation, to tell whether a change made the randomizer faster or slower.
+#
+#   python Benchmark.py                    Runs every benchmark and prints its times.
+#   python Benchmark.py --save             Also stores the times as the baseline.
+#   python Benchmark.py --compare          Flags the times that got slower than the baseline.
+#   python Benchmark.py -k Beginner -k crc Only runs the benchmarks whose names contain one of these.
+#
+# The generate/ benchmarks generate a fixed seed for every preset and every tests/*.sav settings
+# file and time each phase of generation. The micro/ benchmarks time single hot paths on a seed
+# of the default settings, and on a synthetic ROM for the ones that need a ROM.
+#
+# Times are CPU times in seconds. Every benchmark runs --repeat times and keeps the fastest run,
+# since noise only ever adds time. Baselines depend on the machine, so they aren't committed.
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from typing import Any, Dict
+
+from Fill import distribute_items_restrictive, ShuffleError
+from Instrumentation import instrumentation
+from Main import main, resolve_settings, build_world_graphs, seed_attempt
+from N64Patch import create_patch_file
+from Rom import Rom
+from Search import Search
+from Settings import Settings, get_preset_files
+from Spoiler import Spoiler
+from World import World
+from crc import calculate_crc
+
+test_dir = os.path.join(os.path.dirname(__file__), 'tests')
+default_baseline = os.path.join(test_dir, 'benchmark_baseline.json')
+
+# These presets fail to generate too often to be timed reliably, see TestValidSpoilers.test_presets.
+skipped_presets = ("Fenhl's Casual", "Fenhl's Casual (TOoTR compat)", '3rd Mixed Pools Tournament', 'Hell Mode')
+
+Timings = Dict[str, float]
+
+
+def spoiler_only(settings_dict: dict[str, Any], output_dir: str) -> Settings:
+    settings_dict.update({
+        'create_patch_file': False,
+        'create_compressed_rom': False,
+        'create_wad_file': False,
+        'create_uncompressed_rom': False,
+        'count': 1,
+        'create_spoiler': True,
+        'output_dir': output_dir,
+        'output_file': '',
+        'seed': 'BENCHMARK',
+    })
+    settings = Settings(settings_dict)
+    # Some settings files fix a seed of their own.
+    settings.update_seed('BENCHMARK')
+    return settings
+
+
+def generate_benchmarks(output_dir: str) -> dict[str, Callable[[], Timings]]:
+    settings_dicts = {}
+    for fn in get_preset_files():
+        with open(fn, encoding='utf-8') as f:
+            for name, settings_dict in json.load(f).items():
+                if name not in skipped_presets:
+                    settings_dicts[f'generate/{name}'] = settings_dict
+    for fn in sorted(os.listdir(test_dir)):
+        if fn.endswith('.sav'):
+            with open(os.path.join(test_dir, fn), encoding='utf-8') as f:
+                settings_dicts[f'generate/{fn}'] = json.load(f)
+
+    def generate(settings_dict: dict[str, Any]) -> Timings:
+        main(spoiler_only(json.loads(json.dumps(settings_dict)), output_dir))
+        timings = {'total': time.process_time() - instrumentation.start_cpu}
+        timings.update((phase, times['cpu']) for phase, times in instrumentation.phases.items())
+        return timings
+
+    return {name: (lambda settings_dict=settings_dict: generate(settings_dict)) for name, settings_dict in settings_dicts.items()}
+
+
+# Retries like main does. The instrumentation only holds the attempt that succeeded.
+def filled_worlds(output_dir: str, max_attempts: int = 10) -> list[World]:
+    settings = spoiler_only({}, output_dir)
+    _, world_settings = resolve_settings(settings)
+    for attempt in range(1, max_attempts + 1):
+        seed_attempt(settings, attempt)
+        worlds = build_world_graphs(world_settings)
+        instrumentation.reset()
+        try:
+            distribute_items_restrictive(worlds)
+            return worlds
+        except ShuffleError:
+            if attempt >= max_attempts:
+                raise
+            for world_setting in world_settings:
+                world_setting.reset_distribution()
+    raise RuntimeError('Generation failed.')
+
+
+def synthetic_rom() -> Rom:
+    # A ROM of random bytes with a few thousand patched spans, about as many bytes as a seed changes.
+    rng = random.Random('BENCHMARK')
+    rom = Rom()
+    rom.buffer = bytearray(rng.getrandbits(8 * 0x4000000).to_bytes(0x4000000, 'little'))
+    rom.original = rom.copy()
+    for _ in range(4000):
+        address = rng.randrange(0x1000, 0x3F00000)
+        length = rng.randrange(1, 1000)
+        rom.write_bytes(address, rng.getrandbits(8 * length).to_bytes(length, 'little'))
+    return rom
+
+
+def micro_benchmarks(output_dir: str) -> dict[str, Callable[[], Timings]]:
+    def timed(function: Callable[[], Any]) -> Timings:
+        start = time.process_time()
+        function()
+        return {'total': time.process_time() - start}
+
+    def collect_locations() -> Timings:
+        worlds = filled_worlds(output_dir)
+        # A single search of a filled seed only takes milliseconds.
+        def collect_all_locations() -> None:
+            for _ in range(50):
+                Search([world.state for world in worlds]).collect_locations()
+        return timed(collect_all_locations)
+
+    def fill_restrictive() -> Timings:
+        filled_worlds(output_dir)
+        return {'total': instrumentation.phases['fill_restrictive']['cpu']}
+
+    def create_playthrough() -> Timings:
+        spoiler = Spoiler(filled_worlds(output_dir))
+        return timed(spoiler.create_playthrough)
+
+    def patch_file() -> Timings:
+        rom = synthetic_rom()
+        return timed(lambda: create_patch_file(rom, os.path.join(output_dir, 'benchmark.zpf')))
+
+    def crc() -> Timings:
+        rom = synthetic_rom()
+        return timed(lambda: calculate_crc(rom))
+
+    return {
+        'micro/collect_locations': collect_locations,
+        'micro/fill_restrictive': fill_restrictive,
+        'micro/create_playthrough': create_playthrough,
+        'micro/create_patch_file': patch_file,
+        'micro/calculate_crc': crc,
+    }
+
+
+def run_benchmark(benchmark: Callable[[], Timings], repeat: int) -> Timings:
+    best: Timings = {}
+    for _ in range(repeat):
+        for measure, seconds in benchmark().items():
+            best[measure] = min(seconds, best.get(measure, seconds))
+    return best
+
+
+# Returns the measures that took more than tolerance times their baseline, with both times.
+# Measures under min_seconds are left out, since they are too short to compare reliably.
+def find_regressions(results: dict[str, Timings], baseline: dict[str, Timings], tolerance: float,
+                     min_seconds: float = 0.05) -> dict[str, tuple[float, float]]:
+    regressions = {}
+    for name, timings in results.items():
+        for measure, seconds in timings.items():
+            base = baseline.get(name, {}).get(measure)
+            if base is not None and max(seconds, base) >= min_seconds and seconds > base * tolerance:
+                regressions[f'{name} {measure}'] = (base, seconds)
+    return regressions
+
+
+def start() -> None:
+    parser = argparse.ArgumentParser(description='Times seed generation and compares the times to a stored baseline.')
+    parser.add_argument('-k', dest='filters', action='append', default=[], help='Only run the benchmarks whose names contain this. Can be given multiple times.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of times to run each benchmark. The fastest run is kept.')
+    parser.add_argument('--baseline', default=default_baseline, help='JSON file with the baseline times.')
+    parser.add_argument('--save', action='store_true', help='Store the times as the baseline, keeping the baseline of benchmarks that were not run.')
+    parser.add_argument('--compare', action='store_true', help='Flag the times that are slower than the baseline, exiting with status 1 if there are any.')
+    parser.add_argument('--tolerance', type=float, default=1.2, help='How many times the baseline a time may take before it is flagged.')
+    parser.add_argument('--output', help='Also write the times to this JSON file.')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(message)s', level=logging.ERROR)
+    logger = logging.getLogger('')
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        benchmarks = {**generate_benchmarks(output_dir), **micro_benchmarks(output_dir)}
+        if args.filters:
+            benchmarks = {name: benchmark for name, benchmark in benchmarks.items() if any(f in name for f in args.filters)}
+
+        results = {}
+        failed = False
+        for name, benchmark in benchmarks.items():
+            try:
+                results[name] = run_benchmark(benchmark, max(args.repeat, 1))
+            except Exception as ex:
+                logger.error('%s failed: %s: %s', name, type(ex).__name__, ex)
+                failed = True
+                continue
+            print(f"{name}: {results[name]['total']:.3f}s", flush=True)
+            for measure, seconds in results[name].items():
+                if measure != 'total':
+                    print(f'    {measure}: {seconds:.3f}s')
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+    if args.compare:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for measure, (base, seconds) in regressions.items():
+            print(f'REGRESSION {measure}: {base:.3f}s -> {seconds:.3f}s ({seconds / base:.2f}x)')
+        if not regressions:
+            print(f'No regressions against {args.baseline}.')
+        failed = failed or bool(regressions)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=4)
+        print(f'Saved the baseline to {args.baseline}.')
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    start()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Optional, Any
 
+from RulesCommon import combine_rules
+
 if TYPE_CHECKING:
     from Region import Region
     from RulesCommon import AccessRule
@@ -54,11 +56,15 @@ class Entrance:
         if self.never:
             return
         self.access_rules.append(lambda_rule)
-        self.access_rule = lambda state, **kwargs: all(rule(state, **kwargs) for rule in self.access_rules)
+        self.access_rule = combine_rules(tuple(self.access_rules))
+        if self.world is not None:
+            self.world.clear_rule_index()
 
     def set_rule(self, lambda_rule: AccessRule) -> None:
         self.access_rule = lambda_rule
         self.access_rules = [lambda_rule]
+        if self.world is not None:
+            self.world.clear_rule_index()
 
     def connect(self, region: Region) -> None:
         self.connected_region = region
@@ -89,6 +95,7 @@ class Entrance:
         target_entrance.connect(self.connected_region)
         target_entrance.replaces = self
         root.exits.append(target_entrance)
+        self.world.clear_rule_index()
         return target_entrance
 
     def assume_reachable(self) -> Entrance:
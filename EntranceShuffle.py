@@ -13,6 +13,7 @@ from Rules import set_entrances_based_rules
 from State import State
 from Item import ItemFactory
 from Hints import HintArea, HintAreaNotFound
+from Instrumentation import instrumentation
 from HintList import misc_item_hint_table
 
 if TYPE_CHECKING:
@@ -915,6 +916,7 @@ def shuffle_one_way_priority_entrances(worlds: list[World], world: World, one_wa
             for entrance, target in rollbacks:
                 restore_connections(entrance, target)
             logging.getLogger('').info('Failed to place all priority one-way entrances for world %d. Will retry %d more times', world.id, retry_count)
+            instrumentation.count('entrance_retries')
             logging.getLogger('').info('\t%s' % error)
             last_error = error
 
@@ -961,6 +963,7 @@ def shuffle_entrance_pool(world: World, worlds: list[World], entrance_pool: list
             for entrance, target in rollbacks:
                 restore_connections(entrance, target)
             logging.getLogger('').info('Failed to place all entrances in a pool for world %d. Will retry %d more times', entrance_pool[0].world.id, retry_count)
+            instrumentation.count('entrance_retries')
             logging.getLogger('').info('\t%s' % error)
 
     if world.settings.custom_seed:
@@ -1352,4 +1355,6 @@ def delete_target_entrance(target_entrance: Entrance) -> None:
         target_entrance.disconnect()
     if target_entrance.parent_region is not None:
         target_entrance.parent_region.exits.remove(target_entrance)
+        if target_entrance.world is not None:
+            target_entrance.world.clear_rule_index()
         target_entrance.parent_region = None
@@ -1,10 +1,13 @@
 from __future__ import annotations
 import random
 import logging
+import multiprocessing
+import time
 from typing import TYPE_CHECKING, Optional
 
 from Hints import HintArea
 from Item import Item, ItemFactory, ItemInfo
+from Instrumentation import instrumentation
 from ItemPool import remove_junk_items
 from Location import Location, DisableType
 from LocationList import location_groups
@@ -13,6 +16,8 @@ from Search import Search
 from State import State
 
 if TYPE_CHECKING:
+    from Region import Region
+    from Settings import Settings
     from World import World
 
 logger = logging.getLogger('')
@@ -206,7 +211,8 @@ def distribute_items_restrictive(worlds: list[World], fill_locations: Optional[l
     # Items in this group will check for reachability and will be placed
     # such that the game is guaranteed beatable.
     logger.info('Placing progression items.')
-    fill_restrictive(worlds, search, fill_locations, progitempool)
+    with instrumentation.phase('fill_restrictive'):
+        fill_restrictive(worlds, search, fill_locations, progitempool)
     search.collect_locations()
 
     # Place all priority items.
@@ -269,9 +275,129 @@ def fill_dungeons_restrictive(worlds: list[World], search: Search, shuffled_loca
     dungeon_items.sort(key=lambda item: sort_order.get(item.type, 1))
 
     # place dungeon items
+    if worlds[0].settings.fill_dungeon_items_per_dungeon:
+        dungeon_items = fill_dungeon_groups(worlds, base_search, shuffled_locations, dungeon_items, worlds[0].settings.dungeon_fill_workers)
     fill_restrictive(worlds, base_search, shuffled_locations, dungeon_items)
 
 
+# The items of each dungeon that are restricted to it can only be placed in that dungeon of their own world, so with
+# settings.fill_dungeon_items_per_dungeon they're placed separately for every dungeon, each assuming every other
+# item, with settings.dungeon_fill_workers processes at once. Each dungeon is placed from a seed of its own, drawn
+# in order from the random state, so where the items end up doesn't depend on the number of processes, or on whether
+# processes can be forked at all, but it differs from placing all the dungeons at once. Items that don't belong to a
+# single dungeon, like the Light Medallion, are returned to be placed afterwards. A dungeon may still depend on the
+# items of another, like when its entrance is behind another dungeon, so the dungeons are checked to be reachable
+# together afterwards. If they're not, or a dungeon couldn't be placed on its own, nothing is placed and all the
+# items are returned to be placed at once. It is off by default, since it changes the seed a settings string and
+# seed generate.
+def fill_dungeon_groups(worlds: list[World], base_search: Search, shuffled_locations: list[Location], dungeon_items: list[Item], processes: int) -> list[Item]:
+    global dungeon_groups
+
+    item_dungeons = {item: (world.id, dungeon.name) for world in worlds for dungeon in world.dungeons for item in dungeon.get_restricted_dungeon_items()}
+    group_items: dict[tuple[int, str], list[Item]] = {}
+    remaining_items = []
+    for item in dungeon_items:
+        if item in item_dungeons:
+            group_items.setdefault(item_dungeons[item], []).append(item)
+        else:
+            remaining_items.append(item)
+    if len(group_items) < 2:
+        return dungeon_items
+    group_locations: dict[tuple[int, str], list[Location]] = {key: [] for key in group_items}
+    for location in shuffled_locations:
+        key = (location.world.id, HintArea.at(location).dungeon_name)
+        if location.item is None and key in group_locations:
+            group_locations[key].append(location)
+
+    dungeon_groups = [(worlds, base_search, [item for item in dungeon_items if item_dungeons.get(item) != key], group_locations[key], items)
+                      for key, items in group_items.items()]
+    seeds = [random.getrandbits(64) for _ in dungeon_groups]
+
+    logger.info('Placing the items of %d dungeons in up to %d processes.', len(dungeon_groups), processes)
+    try:
+        # Worlds can't be sent between processes, so the workers are forked to start with them.
+        if processes > 1 and 'fork' in multiprocessing.get_all_start_methods() and not multiprocessing.current_process().daemon:
+            with multiprocessing.get_context('fork').Pool(min(processes, len(dungeon_groups))) as pool:
+                results = pool.starmap(fill_dungeon_group, enumerate(seeds))
+        else:
+            results = [fill_dungeon_group(index, seed) for index, seed in enumerate(seeds)]
+    finally:
+        groups, dungeon_groups = dungeon_groups, []
+    for result in results:
+        if isinstance(result, str):
+            logger.info('Failed to place the items of a dungeon on its own: %s. Placing them at once.', result)
+            return dungeon_items
+
+    placed_locations = []
+    for (_, _, _, locations, items), placements in zip(groups, results):
+        for location_index, item_index, disabled in placements:
+            location = locations[location_index]
+            item = items[item_index]
+            placed_locations.append((location, location.price, item.price))
+            location.world.push_item(location, item)
+            if disabled:
+                location.disabled = DisableType.DISABLED
+
+    # Like in fill_restrictive, worlds that only have to be beatable only need their dungeons not to lock each other
+    # out of the items they need, and otherwise every item has to be reachable.
+    search = base_search.copy()
+    search.collect_all(remaining_items)
+    search.collect_locations()
+    if all(world.check_beatable_only for world in worlds):
+        predicates = [(lambda state: state.won() and state.has_all_item_goals()) if world.settings.reachable_locations == 'goals' else State.won for world in worlds]
+        independent = search.can_beat_game(scan_for_items=False, predicates=predicates)
+    else:
+        search.visit_locations([location for location, _, _ in placed_locations])
+        independent = all(search.visited(location) for location, _, _ in placed_locations)
+    if independent:
+        filled_locations = {location for location, _, _ in placed_locations}
+        shuffled_locations[:] = [location for location in shuffled_locations if location not in filled_locations]
+        instrumentation.count('dungeon_fill_groups', len(groups))
+        return remaining_items
+    logger.info('The dungeons depend on each other. Placing their items at once.')
+    for location, location_price, item_price in placed_locations:
+        location.item.location = None
+        location.item.price = item_price
+        location.item = None
+        location.price = location_price
+        if location.disabled == DisableType.DISABLED:
+            location.disabled = DisableType.PENDING
+    return dungeon_items
+
+
+# The dungeons placed by fill_dungeon_groups, which forked workers start with: the worlds, the search to place
+# them from, the items of the other dungeons, and the locations and items of the dungeon.
+dungeon_groups: list[tuple[list[World], Search, list[Item], list[Location], list[Item]]] = []
+
+
+# Places the items of a dungeon from a seed of its own and takes them back, returning the placements as the indexes
+# of the locations and items of the dungeon, and whether each location was disabled, or the error it failed with.
+def fill_dungeon_group(index: int, seed: int) -> list[tuple[int, int, bool]] | str:
+    worlds, base_search, other_items, locations, items = dungeon_groups[index]
+    search = base_search.copy()
+    search.collect_all(other_items)
+    saved = [(location, location.price, location.disabled) for location in locations]
+    item_prices = [(item, item.price) for item in items]
+    random_state = random.getstate()
+    random.seed(seed)
+    try:
+        fill_restrictive(worlds, search, locations.copy(), items.copy())
+        location_indexes = {location: location_index for location_index, location in enumerate(locations)}
+        return [(location_indexes[item.location], item_index, item.location.disabled == DisableType.DISABLED) for item_index, item in enumerate(items)]
+    except FillError as e:
+        return str(e)
+    finally:
+        random.setstate(random_state)
+        for location, price, disabled in saved:
+            if location.item is not None:
+                location.item.location = None
+                location.item = None
+            location.price = price
+            location.disabled = disabled
+        for item, price in item_prices:
+            item.price = price
+
+
 # Places items into dungeon locations. This is used when there should be exactly
 # one progression item per dungeon. This should be run before all the progression
 # items are places to ensure there is space to place them.
@@ -388,6 +514,7 @@ def fill_ownworld_restrictive(worlds: list[World], search: Search, locations: li
                 logger.info("Placed %s items for world %s.", description, (world.id+1))
             except FillError as e:
                 logger.info("Failed to place %s items for world %s. Will retry %s more times.", description, (world.id+1), world_attempts)
+                instrumentation.count('fill_retries')
                 for location in prize_locs_dict[world.id]:
                     location.item = None
                     location.price = None
@@ -400,6 +527,172 @@ def fill_ownworld_restrictive(worlds: list[World], search: Search, locations: li
             raise FillError(f'Unable to place {description} items in world {world.id + 1}')
 
 
+# Answers Location.can_fill_fast for fill_restrictive, which asks it about the same items over and over.
+# The answer only depends on the item's name and world, and on the location's region and item rule,
+# so it is worked out once for every kind of item: first for the region, which is shared by all of its
+# locations and is where the restrictions by dungeon and hint area are, then for the location. It also finds
+# where the items of other worlds have to be reachable in their own worlds.
+class FillCandidates:
+    def __init__(self) -> None:
+        self.region_fills: dict[tuple[str, int], dict[Region, bool]] = {}
+        self.location_fills: dict[tuple[str, int], dict[Location, bool]] = {}
+        self.world_spots: dict[int, tuple[dict[str, Location], dict[str, Region]]] = {}
+        self.source_spots: dict[tuple[Location, int], Optional[Location | Region]] = {}
+
+    def can_fill_fast(self, location: Location, item: Item) -> bool:
+        key = (item.name, item.world.id)
+        location_fills = self.location_fills.setdefault(key, {})
+        if location not in location_fills:
+            region = location.parent_region
+            if region is None:
+                location_fills[location] = False
+            else:
+                region_fills = self.region_fills.setdefault(key, {})
+                if region not in region_fills:
+                    region_fills[region] = region.can_fill(item)
+                location_fills[location] = region_fills[region] and location.item_rule(location, item)
+        return location_fills[location]
+
+    # Location.can_fill, with the part of it that can_fill_fast answers looked up.
+    def can_fill(self, location: Location, state: State, item: Item, check_access: bool = True) -> bool:
+        if state.search is None:
+            return False
+        if location.minor_only and item.majoritem:
+            return False
+        return (
+            not location.is_disabled and
+            self.can_fill_fast(location, item) and
+            (not check_access or state.search.spot_access(location, 'either'))
+        )
+
+    # Filled locations are never asked about again.
+    def remove(self, location: Location) -> None:
+        for location_fills in self.location_fills.values():
+            location_fills.pop(location, None)
+
+    # Where an item of another world placed at a location has to be reachable in its own world: the location of the
+    # same name in that world, or if there's none, the first region the location is entered through that exists in
+    # that world, or None if there's no such region either. Worlds only look up names they have quickly, so each world's
+    # locations and regions are put in tables by name once, and each location is looked up once per world.
+    def source_spot(self, location: Location, world: World) -> Optional[Location | Region]:
+        key = (location, world.id)
+        if key not in self.source_spots:
+            if world.id not in self.world_spots:
+                self.world_spots[world.id] = ({spot.name: spot for spot in world.get_locations()}, {region.name: region for region in world.regions})
+            locations, regions = self.world_spots[world.id]
+            spot = locations.get(location.name)
+            if spot is None:
+                parent_region = location.parent_region
+                while parent_region:
+                    spot = regions.get(parent_region.name)
+                    if spot is not None:
+                        break
+                    parent_region = parent_region.entrances[0].parent_region
+            self.source_spots[key] = spot
+        return self.source_spots[key]
+
+
+# Takes back placements of fill_restrictive when an item can't be placed anywhere, instead of failing the whole
+# attempt. Placements are taken back in the reverse order they were made, which keeps every placement that is
+# left valid, back to the last one at a location the item could be placed at, so the item can be placed there,
+# and the items that were taken back are placed again after it. The placement whose location is freed for the
+# item never goes back there. Every time the same item can't be placed, the fill goes back to one more location
+# the item could be placed at, within the last settings.fill_backtrack_depth placements. Taking back a placement
+# only takes collecting its item again, since fill_restrictive explores from the items that are left to place,
+# starting over after placements are taken back. Backtracking is off by default, since it changes the seed a
+# setting string and seed generate. settings.fill_backtrack_seconds limits the time spent in a fill after it first
+# takes placements back. It is off by default, since it makes whether a seed generates at the first attempt depend
+# on the machine.
+class FillBacktracker:
+    def __init__(self, settings: Settings) -> None:
+        self.max_depth: int = settings.fill_backtrack_depth
+        self.seconds: int = settings.fill_backtrack_seconds
+        self.deadline: Optional[float] = None
+        self.placements: list[tuple[Location, Item, Optional[int], Optional[int]]] = []
+        self.backtracks: dict[Item, int] = {}
+        self.excluded_locations: dict[Item, set[Location]] = {}
+
+    def can_place(self, location: Location, item: Item) -> bool:
+        return location not in self.excluded_locations.get(item, ())
+
+    # Records a placement before it is made.
+    def place(self, location: Location, item: Item) -> None:
+        if self.max_depth > 0:
+            self.placements.append((location, item, location.price, item.price))
+
+    # Takes back placements to place item again, putting it and the items that were taken back in the itempool
+    # to be placed in that order, and their locations back in the locations. Returns False if the limits are
+    # reached, and the fill has to fail.
+    def backtrack(self, item: Item, locations: list[Location], itempool: list[Item], items_search: Search,
+                  candidates: FillCandidates) -> bool:
+        backtracks = self.backtracks.get(item, 0) + 1
+        fillable = 0
+        for depth, (location, _, _, _) in enumerate(reversed(self.placements[max(len(self.placements) - self.max_depth, 0):]), start=1):
+            if not (location.minor_only and item.majoritem) and candidates.can_fill_fast(location, item):
+                fillable += 1
+                if fillable == backtracks:
+                    break
+        else:
+            return False
+        if self.deadline is None:
+            if self.seconds > 0:
+                self.deadline = time.monotonic() + self.seconds
+        elif time.monotonic() > self.deadline:
+            return False
+        self.backtracks[item] = backtracks
+
+        for _ in range(depth):
+            location, placed_item, location_price, item_price = self.placements.pop()
+            location.item = None
+            location.price = location_price
+            placed_item.location = None
+            placed_item.price = item_price
+            if location.disabled == DisableType.DISABLED:
+                location.disabled = DisableType.PENDING
+            locations.append(location)
+            itempool.append(placed_item)
+        self.excluded_locations.setdefault(itempool[-1], set()).add(locations[-1])
+        itempool.append(item)
+        items_search.collect_all(itempool[-depth - 1:])
+
+        instrumentation.count('fill_backtracks')
+        instrumentation.count('fill_backtracked_placements', depth)
+        logger.debug('Taking back the last %d placements to place %s [World %d] at %s.', depth, item, item.world.id + 1, locations[-1])
+        return True
+
+
+# Makes the search with every item left to place that fill_restrictive places each item with, from a search that's
+# made again every few placements instead of from the collected items alone. The items left to place only get fewer,
+# and placed items are only collected where they can be reached, so what's reachable with the items that were left
+# to place when that search was made, minus the next few to place, is still reachable when placing each of the
+# next few items. Each placement then only explores what those few items and the items placed since reach. The
+# search has to be made again whenever the items left to place change other than by taking the last one.
+class FillSearch:
+    interval: int = 4
+
+    def __init__(self, items_search: Search) -> None:
+        self.items_search: Search = items_search
+        self.search: Optional[Search] = None
+        self.size: int = 0
+
+    # The items left to place have to be collected in the items search, and the item to place uncollected.
+    def max_search(self, itempool: list[Item]) -> Search:
+        if self.search is None or len(itempool) < self.size:
+            self.size = max(len(itempool) - self.interval, 0)
+            self.search = self.items_search.copy()
+            for item in itempool[self.size:]:
+                if item.solver_id is not None:
+                    self.search.uncollect(item)
+            self.search.collect_locations()
+        max_search = self.search.copy()
+        max_search.collect_all(itempool[self.size:])
+        max_search.collect_locations()
+        return max_search
+
+    def reset(self) -> None:
+        self.search = None
+
+
 # Places items in the itempool into locations.
 # worlds is a list of worlds and is redundant of the worlds in the base_state_list
 # base_state_list is a list of world states prior to placing items in the item pool
@@ -422,6 +715,9 @@ def fill_restrictive(worlds: list[World], base_search: Search, locations: list[L
     # don't run over this search, just keep it as an item collection
     items_search = base_search.copy()
     items_search.collect_all(itempool)
+    candidates = FillCandidates()
+    backtracker = FillBacktracker(worlds[0].settings)
+    fill_search = FillSearch(items_search)
     logging.getLogger('').debug(f'Placing {len(itempool)} items among {len(locations)} potential locations.')
     itempool.sort(key=lambda item: not item.priority)
 
@@ -434,7 +730,7 @@ def fill_restrictive(worlds: list[World], base_search: Search, locations: list[L
         # get an item and remove it from the itempool
         item_to_place = itempool.pop()
         if item_to_place.priority:
-            l2cations = [l for l in locations if l.can_fill_fast(item_to_place)]
+            l2cations = [l for l in locations if candidates.can_fill_fast(l, item_to_place)]
         elif item_to_place.majoritem:
             l2cations = [l for l in locations if not l.minor_only]
         else:
@@ -444,8 +740,7 @@ def fill_restrictive(worlds: list[World], base_search: Search, locations: list[L
         # generate the max search with every remaining item
         # this will allow us to place this item in a reachable location
         items_search.uncollect(item_to_place)
-        max_search = items_search.copy()
-        max_search.collect_locations()
+        max_search = fill_search.max_search(itempool)
 
         # perform_access_check checks location reachability
         predicates = []
@@ -469,31 +764,23 @@ def fill_restrictive(worlds: list[World], base_search: Search, locations: list[L
         # in the world we are placing it (possibly checking for reachability)
         spot_to_fill = None
         for location in l2cations:
-            if location.can_fill(max_search.state_list[location.world.id], item_to_place, perform_access_check):
+            if not backtracker.can_place(location, item_to_place):
+                continue
+            if candidates.can_fill(location, max_search.state_list[location.world.id], item_to_place, perform_access_check):
                 # for multiworld, make it so that the location is also reachable
                 # in the world the item is for. This is to prevent early restrictions
                 # in one world being placed late in another world. If this is not
                 # done then one player may be waiting a long time for other players.
                 if location.world.id != item_to_place.world.id:
-                    try:
-                        source_location = item_to_place.world.get_location(location.name)
-                        if not source_location.can_fill(max_search.state_list[item_to_place.world.id], item_to_place, perform_access_check):
+                    source_spot = candidates.source_spot(location, item_to_place.world)
+                    if isinstance(source_spot, Location):
+                        if not candidates.can_fill(source_spot, max_search.state_list[item_to_place.world.id], item_to_place, perform_access_check):
                             # location wasn't reachable in item's world, so skip it
                             continue
-                    except KeyError:
-                        # This location doesn't exist in the other world, let's look elsewhere.
-                        # Check access to whatever parent region exists in the other world.
-                        can_reach = True
-                        parent_region = location.parent_region
-                        while parent_region:
-                            try:
-                                source_region = item_to_place.world.get_region(parent_region.name)
-                                can_reach = max_search.can_reach(source_region)
-                                break
-                            except KeyError:
-                                parent_region = parent_region.entrances[0].parent_region
-                        if not can_reach:
-                            continue
+                    elif source_spot is not None and not max_search.can_reach(source_spot):
+                        # This location doesn't exist in the other world, and whatever parent region
+                        # exists in the other world isn't reachable.
+                        continue
 
                 if location.disabled == DisableType.PENDING:
                     if not max_search.can_beat_game(False):
@@ -511,14 +798,20 @@ def fill_restrictive(worlds: list[World], base_search: Search, locations: list[L
                 # don't decrement count, we didn't place anything
                 unplaced_items.append(item_to_place)
                 items_search.collect(item_to_place)
+                fill_search.reset()
+                continue
+            elif backtracker.backtrack(item_to_place, locations, itempool, items_search, candidates):
+                fill_search.reset()
                 continue
             else:
                 # we expect all items to be placed
                 raise FillError(f'Game unbeatable: No more spots to place {item_to_place} [World {item_to_place.world.id + 1}] from {len(l2cations)} locations ({len(locations)} total); {len(itempool)} other items left to place, plus {len(unplaced_items)} skipped')
 
         # Place the item in the world and continue
+        backtracker.place(spot_to_fill, item_to_place)
         spot_to_fill.world.push_item(spot_to_fill, item_to_place)
         locations.remove(spot_to_fill)
+        candidates.remove(spot_to_fill)
 
         # decrement count
         count -= 1
@@ -318,6 +318,7 @@ def lock_category_entrances(category: GoalCategory, state_list: Iterable[State])
                 exit = state.world.get_entrance(lock)
                 category_locks[index][exit.name] = exit.access_rule
                 exit.access_rule = lambda state, **kwargs: False
+            state.world.clear_rule_index()
     return category_locks
 
 
@@ -328,6 +329,7 @@ def unlock_category_entrances(category_locks: dict[int, dict[str, AccessRule]],
         for exit_name, access_rule in exits.items():
             exit = state_list[state_id].world.get_entrance(exit_name)
             exit.access_rule = access_rule
+        state_list[state_id].world.clear_rule_index()
 
 
 def search_goals(categories: dict[str, GoalCategory], reachable_goals: ValidGoals, search: Search, priority_locations: dict[int, dict[str, str]],
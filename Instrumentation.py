@@ -0,0 +1,62 @@
+from __future__ import annotations
+import json
+import logging
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+
+# Records the wall and CPU time spent in each phase of generating a seed, and counts of
+# events like access rule checks or retries, to tell which settings make generation slow.
+# Phases can be nested, in which case the time of the inner phase is included in the outer one.
+class Instrumentation:
+    def __init__(self) -> None:
+        self.phases: dict[str, dict[str, float]] = {}
+        self.counters: Counter[str] = Counter()
+        self.start_wall: float = time.perf_counter()
+        self.start_cpu: float = time.process_time()
+
+    def reset(self) -> None:
+        self.phases.clear()
+        self.counters.clear()
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            times = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            times['wall'] += time.perf_counter() - start_wall
+            times['cpu'] += time.process_time() - start_cpu
+            times['calls'] += 1
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            'total': {'wall': time.perf_counter() - self.start_wall, 'cpu': time.process_time() - self.start_cpu},
+            'phases': {name: dict(times) for name, times in self.phases.items()},
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+    def to_file(self, filename: str) -> None:
+        with open(filename, 'w') as outfile:
+            json.dump(self.to_json(), outfile, indent=4)
+
+    def log(self) -> None:
+        logger = logging.getLogger('')
+        for name, times in self.phases.items():
+            logger.debug('%s: %.3fs wall, %.3fs CPU, %d calls', name, times['wall'], times['cpu'], times['calls'])
+        for name, amount in sorted(self.counters.items()):
+            logger.debug('%s: %d', name, amount)
+
+
+# Reset at the start of every seed.
+instrumentation: Instrumentation = Instrumentation()
@@ -6,6 +6,7 @@ from typing import TYPE_CHECKING, Optional, Any, overload
 
 from HintList import misc_item_hint_table, misc_location_hint_table
 from LocationList import location_table, location_is_viewable, LocationAddress, LocationDefault, LocationFilterTags
+from RulesCommon import combine_rules
 
 if TYPE_CHECKING:
     from Dungeon import Dungeon
@@ -79,17 +80,15 @@ class Location:
         if self.never:
             return
         self.access_rules.append(lambda_rule)
-        self.access_rule = self._run_rules
-
-    def _run_rules(self, state, **kwargs):
-        for rule in self.access_rules:
-            if not rule(state, **kwargs):
-                return False
-        return True
+        self.access_rule = combine_rules(tuple(self.access_rules))
+        if self.world is not None:
+            self.world.clear_rule_index()
 
     def set_rule(self, lambda_rule: AccessRule) -> None:
         self.access_rule = lambda_rule
         self.access_rules = [lambda_rule]
+        if self.world is not None:
+            self.world.clear_rule_index()
 
     def can_fill(self, state: State, item: Item, check_access: bool = True) -> bool:
         if state.search is None:
@@ -6,7 +6,7 @@ import platform
 import shutil
 from typing import Optional
 
-from Rom import Rom
+from Rom import Rom, find_changed_ranges
 from Utils import default_output_path, is_bundled, local_path, run_process
 from ntype import BigStream
 
@@ -14,7 +14,7 @@ from ntype import BigStream
 # Handle 3.0 website patches.
 def apply_ootr_3_web_patch(settings, rom: Rom) -> None:
     logger = logging.getLogger('')
-    minibsdiff_path: str = "./" if is_bundled() else "bin/minibsdiff/"
+    minibsdiff_path: str = local_path('' if is_bundled() else 'bin/minibsdiff/')
     minibsdiff_python: bool = False
     if platform.system() == 'Windows':
         if platform.machine() == 'AMD64':
@@ -39,8 +39,8 @@ def apply_ootr_3_web_patch(settings, rom: Rom) -> None:
         minibsdiff_python = True
 
     if minibsdiff_python:
-        # Use the (slow) python re-implementation of minibsdiff.
-        logger.info("Patching ROM using slow Python implementation of minibsdiff. This might take some time.")
+        # Use the python re-implementation of minibsdiff.
+        logger.info("Patching ROM using Python implementation of minibsdiff.")
         apply_minibsdiff_patch_file(rom, settings.patch_file)
     else:
         # Use the minibsdiff binary.
@@ -97,7 +97,7 @@ def apply_minibsdiff_patch_file(rom: Rom, file: str) -> None:
     original_size: int = len(rom.original.buffer)
     size_difference: int = new_size - len(rom.buffer)
     if size_difference > 0:
-        rom.append_bytes([0] * size_difference)
+        rom.buffer.extend(bytes(size_difference))
 
     ctrl_block: list[int] = [0] * 3
     ctrl_block_address: int = 32
@@ -117,19 +117,14 @@ def apply_minibsdiff_patch_file(rom: Rom, file: str) -> None:
             if new_pos + ctrl_block[0] > new_size:
                 raise Exception("Patch file is invalid. Aborting.")
 
-            # Read diff bytes.
-            diff_bytes: bytearray = patch_data.read_bytes(diff_block_address, ctrl_block[0])
+            # Read diff bytes, leaving out those past the end of the original.
+            diff_size: int = max(0, min(ctrl_block[0], original_size - old_pos)) if old_pos >= 0 else 0
+            diff_bytes: bytes = bytes(patch_data.read_bytes(diff_block_address, diff_size))
             diff_block_address += ctrl_block[0]
 
-            # Check for differences.
-            for i, diff_byte in enumerate(diff_bytes):
-                if old_pos + i > original_size:
-                    break
-                original_byte = rom.original.read_byte(old_pos + i)
-                current_byte = rom.read_byte(new_pos + i)
-                new_byte = (original_byte + diff_byte) & 0xFF
-                if new_byte != current_byte:
-                    rom.write_byte(new_pos + i, new_byte)
+            # Add the diff bytes to the original bytes and write the differences.
+            new_bytes = add_bytes(rom.original.buffer[old_pos:old_pos + diff_size], diff_bytes)
+            write_changed_bytes(rom, new_pos, new_bytes)
 
             # Increment positions.
             old_pos += ctrl_block[0]
@@ -140,21 +135,33 @@ def apply_minibsdiff_patch_file(rom: Rom, file: str) -> None:
             if new_pos + ctrl_block[1] > new_size:
                 raise Exception("Patch file is invalid. Aborting.")
 
-            # Read extra bytes.
-            extra_bytes = patch_data.read_bytes(extra_block_address, ctrl_block[1])
+            # Read extra bytes and write the differences.
+            extra_bytes: bytes = bytes(patch_data.read_bytes(extra_block_address, ctrl_block[1]))
             extra_block_address += ctrl_block[1]
-
-            # Check for differences.
-            for i, extra_byte in enumerate(extra_bytes):
-                current_byte = rom.read_byte(new_pos + i)
-                if extra_byte != current_byte:
-                    rom.write_byte(new_pos + i, extra_byte)
+            write_changed_bytes(rom, new_pos, extra_bytes)
 
         # Increment positions.
         old_pos += ctrl_block[2]
         new_pos += ctrl_block[1]
 
 
+# Adds the bytes of two equally long byte strings, each modulo 256. All bytes are added at once as
+# one integer, without their highest bits so no byte carries into the next, which are XORed in after.
+def add_bytes(data: bytes, other_data: bytes) -> bytes:
+    high_bits = int.from_bytes(b'\x80' * len(data), 'big')
+    a = int.from_bytes(data, 'big')
+    b = int.from_bytes(other_data, 'big')
+    low_sum = (a & ~high_bits) + (b & ~high_bits)
+    return (low_sum ^ ((a ^ b) & high_bits)).to_bytes(len(data), 'big')
+
+
+# Writes the bytes that differ from those already in the rom, so only those are marked as changed.
+def write_changed_bytes(rom: Rom, address: int, data: bytes) -> None:
+    current = bytes(rom.buffer[address:address + len(data)])
+    for start, end in find_changed_ranges(data, current, 0, len(data)):
+        rom.write_bytes(address + start, data[start:end])
+
+
 def minibsdiff_read_int64(patch_data: BigStream, position: Optional[int] = None) -> int:
     buffer: bytearray = patch_data.read_bytes(position, 8)
     y: int = 0
@@ -580,9 +580,7 @@ def insert_space(rom: Rom, file: File, vram_start: int, insert_section: int, ins
     # iterate over the relocation table
     relocate_count = rom.read_int32(cur)
     cur += 4
-    for i in range(0, relocate_count):
-        entry = rom.read_int32(cur)
-
+    for entry in rom.read_int32s(cur, relocate_count):
         # parse relocation entry
         section = ((entry & 0xC0000000) >> 30) - 1
         type = (entry & 0x3F000000) >> 24
@@ -658,7 +656,7 @@ def insert_space(rom: Rom, file: File, vram_start: int, insert_section: int, ins
 
     # Move rom bytes
     rom.buffer[(insert_rom + insert_size):(file.end + insert_size)] = rom.buffer[insert_rom:file.end]
-    rom.buffer[insert_rom:(insert_rom + insert_size)] = [0] * insert_size
+    rom.buffer[insert_rom:(insert_rom + insert_size)] = bytes(insert_size)
     file.end += insert_size
 
 
@@ -671,18 +669,15 @@ def add_relocations(rom: Rom, file: File, addresses: list[int | tuple[int, int]]
 
     # read section sizes and build offsets
     section_total = 0
-    for i in range(0, 4):
-        section_size = rom.read_int32(cur)
+    for section_size in rom.read_int32s(cur, 4):
         sections.append(section_total)
         section_total += section_size
-        cur += 4
+    cur += 0x10
 
     # get all entries in relocation table
     relocate_count = rom.read_int32(cur)
     cur += 4
-    for i in range(0, relocate_count):
-        relocations.append(rom.read_int32(cur))
-        cur += 4
+    relocations.extend(rom.read_int32s(cur, relocate_count))
 
     # create new enties
     for address in addresses:
@@ -721,9 +716,8 @@ def add_relocations(rom: Rom, file: File, addresses: list[int | tuple[int, int]]
     relocations.sort(key = lambda val: val & 0xC0FFFFFF)
     rom.write_int32(cur, len(relocations))
     cur += 4
-    for relocation in relocations:
-        rom.write_int32(cur, relocation)
-        cur += 4
+    rom.write_int32s(cur, relocations)
+    cur += 4 * len(relocations)
 
     # Add padded 0?
     rom.write_int32(cur, 0)
@@ -2,13 +2,15 @@ from __future__ import annotations
 import copy
 import hashlib
 import logging
+import multiprocessing
 import os
 import platform
 import random
 import shutil
 import time
 import zipfile
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Any
 
 
 from Cosmetics import CosmeticsLog, patch_cosmetics
@@ -17,64 +19,185 @@ from Fill import distribute_items_restrictive, ShuffleError
 from Goals import update_goal_items, replace_goal_names, calculate_playthrough_locations
 from Hints import build_gossip_hints
 from HintList import clear_hint_exclusion_cache, misc_item_hint_table, misc_location_hint_table
+from Instrumentation import instrumentation
 from ItemPool import generate_itempool
 from MBSDIFFPatch import apply_ootr_3_web_patch
 from Models import patch_model_adult, patch_model_child
 from N64Patch import create_patch_file, apply_patch_file
 from Patches import patch_rom
-from Rom import Rom
+from Rom import Rom, AddressRanges, read_base_rom
 from Rules import set_rules, set_shop_rules
 from Settings import Settings
 from SettingsList import logic_tricks
 from Spoiler import Spoiler
-from Utils import default_output_path, is_bundled, run_process, data_path
+from Utils import default_output_path, is_bundled, local_path, run_process, data_path
 from World import World
 from version import __version__
 
 
-def main(base_settings: Settings, max_attempts: int = 10) -> Spoiler:
+def main(base_settings: Settings, max_attempts: int = 10, rom: Optional[Rom] = None) -> Spoiler:
     clear_hint_exclusion_cache()
     logger = logging.getLogger('')
     start = time.process_time()
+    instrumentation.reset()
 
-    rom, world_settings = resolve_settings(base_settings)
+    with instrumentation.phase('resolve_settings'):
+        rom, world_settings = resolve_settings(base_settings, rom)
 
     max_attempts = max(max_attempts, 1)
     spoiler = None
-    for attempt in range(1, max_attempts + 1):
-        try:
-            spoiler = generate(world_settings)
-            break
-        except ShuffleError as e:
-            logger.warning('Failed attempt %d of %d: %s', attempt, max_attempts, e)
-            if attempt >= max_attempts:
-                raise
-            else:
-                logger.info('Retrying...\n\n')
-            for settings in world_settings:
-                settings.reset_distribution()
+    if base_settings.parallel_attempts > 1 and max_attempts > 1:
+        # Worlds can't be sent between processes, so the first attempt that succeeded is generated again here.
+        attempt = find_successful_attempt(base_settings, max_attempts)
+        seed_attempt(base_settings, attempt)
+        spoiler = generate(world_settings)
+    else:
+        for attempt in range(1, max_attempts + 1):
+            seed_attempt(base_settings, attempt)
+            try:
+                spoiler = generate(world_settings)
+                break
+            except ShuffleError as e:
+                logger.warning('Failed attempt %d of %d: %s', attempt, max_attempts, e)
+                instrumentation.count('generation_retries')
+                if attempt >= max_attempts:
+                    raise
+                else:
+                    logger.info('Retrying...\n\n')
+                for settings in world_settings:
+                    settings.reset_distribution()
     if spoiler is None:
         raise RuntimeError("Generation failed.")
     patch_and_output(base_settings, spoiler, rom)
+    instrumentation.log()
     logger.debug('Total Time: %s', time.process_time() - start)
     return spoiler
 
 
-def resolve_settings(settings: Settings) -> Tuple[Optional[Rom], list[Settings]]:
+# Attempts after the first start from a seed derived from the attempt number rather than from wherever the
+# previous attempt left the random state, so any attempt can be run on its own, and an attempt generates the same
+# world whether attempts are run one at a time or in parallel.
+def seed_attempt(settings: Settings, attempt: int) -> None:
+    if attempt > 1:
+        random.seed(f'{settings.numeric_seed}-{attempt}')
+
+
+# Runs up to settings.parallel_attempts generation attempts at once in separate processes
+# and returns the number of the first attempt that succeeds, reporting the attempts before it that failed.
+def find_successful_attempt(settings: Settings, max_attempts: int) -> int:
+    logger = logging.getLogger('')
+    with multiprocessing.Pool(min(settings.parallel_attempts, max_attempts), initializer=init_worker_logging,
+                              initargs=(logger.getEffectiveLevel(),)) as pool:
+        results = [pool.apply_async(try_generation_attempt, (settings.settings_dict, settings.seed, settings.custom_seed, attempt))
+                   for attempt in range(1, max_attempts + 1)]
+        for attempt, result in enumerate(results, 1):
+            error = result.get()
+            if error is None:
+                if attempt > 1:
+                    logger.info('Attempt %d of %d succeeded after %d failed attempts.', attempt, max_attempts, attempt - 1)
+                # Leaving the pool terminates the attempts still running.
+                return attempt
+            logger.warning('Failed attempt %d of %d: %s', attempt, max_attempts, error)
+            instrumentation.count('generation_retries')
+        raise ShuffleError(error)
+
+
+def try_generation_attempt(settings_dict: dict[str, Any], seed: str, custom_seed: bool, attempt: int) -> Optional[str]:
+    clear_hint_exclusion_cache()
+    settings = Settings(copy.deepcopy(settings_dict))
+    settings.update_seed(seed)
+    settings.custom_seed = custom_seed
+    _, world_settings = resolve_settings(settings, load_rom=False)
+    seed_attempt(settings, attempt)
+    try:
+        generate(world_settings)
+    except ShuffleError as e:
+        return str(e)
+    return None
+
+
+def init_worker_logging(loglevel: int) -> None:
+    # Workers that aren't forked from the main process start without its logging configuration.
+    logging.basicConfig(format='%(message)s', level=loglevel)
+
+
+# Generates settings.count seeds, suffixing the seed with the index of each, spread over
+# settings.generation_workers processes. Each process loads the base ROM once for all of its seeds.
+# Returns the seeds that failed to generate, with the errors they failed with.
+def main_batch(settings: Settings) -> dict[str, str]:
+    logger = logging.getLogger('')
+    seeds = [f'{settings.seed}-{i}' for i in range(settings.count)]
+    failures = {}
+    if uses_rom(settings):
+        # Workers forked from here share the base ROM read here.
+        read_base_rom(settings.rom)
+    with ProcessPoolExecutor(max_workers=min(settings.generation_workers, len(seeds)), initializer=init_rom_worker,
+                             initargs=(settings.settings_dict, logger.getEffectiveLevel())) as executor:
+        futures = {seed: executor.submit(generate_batch_seed, settings.settings_dict, seed, settings.custom_seed) for seed in seeds}
+        for seed, future in futures.items():
+            try:
+                error = future.result()
+            except Exception as ex:
+                error = f'{type(ex).__name__}: {ex}'
+            if error is not None:
+                failures[seed] = error
+    logger.info('Generated %d of %d seeds.', len(seeds) - len(failures), len(seeds))
+    for seed, error in failures.items():
+        logger.error('Seed %s failed: %s', seed, error)
+    return failures
+
+
+# The base ROM of a worker process, loaded once and restored for every seed it generates.
+worker_rom: Optional[Rom] = None
+
+
+def init_rom_worker(settings_dict: dict[str, Any], loglevel: int) -> None:
+    global worker_rom
+    init_worker_logging(loglevel)
+    settings = Settings(copy.deepcopy(settings_dict))
+    if uses_rom(settings):
+        worker_rom = Rom(settings.rom)
+
+
+# Errors are returned as text, since not every exception raised during generation can be pickled.
+def generate_batch_seed(settings_dict: dict[str, Any], seed: str, custom_seed: bool) -> Optional[str]:
+    settings = Settings(copy.deepcopy(settings_dict))
+    settings.update_seed(seed)
+    settings.custom_seed = custom_seed
+    # The batch already keeps every worker busy.
+    settings.parallel_attempts = 1
+    try:
+        main(settings, rom=worker_rom)
+    except Exception as ex:
+        logging.getLogger('').exception(ex)
+        return f'{type(ex).__name__}: {ex}'
+    return None
+
+
+def uses_rom(settings: Settings) -> bool:
+    outputting_specific_world = settings.create_uncompressed_rom or settings.create_compressed_rom or settings.create_wad_file
+    return outputting_specific_world or settings.create_patch_file or settings.patch_without_output
+
+
+# If a ROM is given, it is reset and reused instead of loading the base ROM again.
+# With load_rom=False, no ROM is loaded even if the settings output one.
+def resolve_settings(settings: Settings, rom: Optional[Rom] = None, *, load_rom: bool = True) -> Tuple[Optional[Rom], list[Settings]]:
     logger = logging.getLogger('')
 
     settings.load_distribution()
 
     # we load the rom before creating the seed so that errors get caught early
     outputting_specific_world = settings.create_uncompressed_rom or settings.create_compressed_rom or settings.create_wad_file
-    using_rom = outputting_specific_world or settings.create_patch_file or settings.patch_without_output
+    using_rom = uses_rom(settings)
     if not (using_rom or settings.patch_without_output) and not settings.create_spoiler:
         raise Exception('You must have at least one output type or spoiler log enabled to produce anything.')
 
-    if using_rom:
+    if not (using_rom and load_rom):
+        rom = None
+    elif rom is None:
         rom = Rom(settings.rom)
     else:
-        rom = None
+        rom.restore()
 
     if not settings.world_count:
         settings.world_count = 1
@@ -109,8 +232,10 @@ def resolve_settings(settings: Settings) -> Tuple[Optional[Rom], list[Settings]]
     return rom, world_settings
 
 def generate(world_settings: list[Settings]) -> Spoiler:
-    worlds = build_world_graphs(world_settings)
-    place_items(worlds)
+    with instrumentation.phase('build_world_graphs'):
+        worlds = build_world_graphs(world_settings)
+    with instrumentation.phase('distribute_items_restrictive'):
+        place_items(worlds)
     for world in worlds:
         world.distribution.configure_effective_starting_items(worlds, world)
     if any(world.enable_goal_hints for world in worlds):
@@ -163,7 +288,8 @@ def build_world_graphs(world_settings: list[Settings]) -> list[World]:
         settings.distribution.configure_triforce_hunt(worlds)
 
     logger.info('Setting Entrances.')
-    set_entrances(worlds, savewarps_to_connect)
+    with instrumentation.phase('set_entrances'):
+        set_entrances(worlds, savewarps_to_connect)
     return worlds
 
 
@@ -178,13 +304,17 @@ def make_spoiler(world_settings: list[Settings], worlds: list[World]) -> Spoiler
     spoiler = Spoiler(worlds)
     if any(settings.create_spoiler or settings.hints != 'none' for settings in world_settings):
         logger.info('Calculating playthrough.')
-        spoiler.create_playthrough()
+        with instrumentation.phase('create_playthrough'):
+            spoiler.create_playthrough()
 
         logger.info('Calculating hint data.')
-        update_goal_items(spoiler)
+        with instrumentation.phase('update_goal_items'):
+            update_goal_items(spoiler)
         if any(world.has_hint_type('playthrough-location') or world.has_hint_type('unlock-playthrough') or world.has_hint_type('wanderer') for world in worlds):
-            calculate_playthrough_locations(spoiler)
-        build_gossip_hints(spoiler, worlds)
+            with instrumentation.phase('calculate_playthrough_locations'):
+                calculate_playthrough_locations(spoiler)
+        with instrumentation.phase('build_gossip_hints'):
+            build_gossip_hints(spoiler, worlds)
     elif (
         any(world.dungeon_rewards_hinted for world in worlds)
         or any(hint_type in settings.misc_hints for settings in world_settings for hint_type in misc_item_hint_table)
@@ -207,8 +337,10 @@ def prepare_rom(spoiler: Spoiler, world: World, rom: Rom, settings: Settings, rn
 
     if restore:
         rom.restore()
-    patch_rom(spoiler, world, rom)
-    cosmetics_log = patch_cosmetics(settings, rom)
+    with instrumentation.phase('patch_rom'):
+        patch_rom(spoiler, world, rom)
+    with instrumentation.phase('patch_cosmetics'):
+        cosmetics_log = patch_cosmetics(settings, rom)
     if not settings.generating_patch_file:
         if settings.model_adult != "Default" or len(settings.model_adult_filepicker) > 0:
             patch_model_adult(rom, settings, cosmetics_log)
@@ -220,7 +352,7 @@ def prepare_rom(spoiler: Spoiler, world: World, rom: Rom, settings: Settings, rn
 
 def compress_rom(input_file: str, output_file: str, delete_input: bool = False) -> None:
     logger = logging.getLogger('')
-    compressor_path = "./" if is_bundled() else "bin/Compress/"
+    compressor_path = local_path('' if is_bundled() else 'bin/Compress/')
     if platform.system() == 'Windows':
         if platform.machine() == 'AMD64':
             compressor_path += "Compress.exe"
@@ -295,7 +427,7 @@ def generate_wad(wad_file: str, rom_file: str, output_file: str, channel_title:
     else:
         raise Exception('Base WAD file is not a valid OoT USA or JPN wad.')
 
-    gzinject_path = "./" if is_bundled() else "bin/gzinject/"
+    gzinject_path = local_path('' if is_bundled() else 'bin/gzinject/')
     gzinject_patch_path = gzinject_path + wad_patch_name
     if platform.system() == 'Windows':
         if platform.machine() == 'AMD64':
@@ -374,7 +506,8 @@ def patch_and_output(settings: Settings, spoiler: Spoiler, rom: Optional[Rom]) -
                 logger.info(f"Creating Patch File: {patch_filename}")
                 output_path = os.path.join(output_dir, patch_filename)
                 file_list.append(patch_filename)
-                create_patch_file(rom, output_path)
+                with instrumentation.phase('create_patch_file'):
+                    create_patch_file(rom, output_path)
 
                 # Cosmetics Log for patch file only.
                 if settings.create_cosmetics_log and patch_cosmetics_log:
@@ -408,7 +541,8 @@ def patch_and_output(settings: Settings, spoiler: Spoiler, rom: Optional[Rom]) -
             compressed_filename = f"{output_filename_base}{player_filename_suffix}.z64"
             compressed_path = os.path.join(output_dir, compressed_filename)
             logger.info(f"Compressing ROM: {compressed_filename}")
-            compress_rom(uncompressed_path, compressed_path, not settings.create_uncompressed_rom)
+            with instrumentation.phase('compress_rom'):
+                compress_rom(uncompressed_path, compressed_path, not settings.create_uncompressed_rom)
             logger.info("Created compressed ROM at: %s" % compressed_path)
 
             # If we aren't generating a WAD, we're done with this world.
@@ -456,6 +590,11 @@ def patch_and_output(settings: Settings, spoiler: Spoiler, rom: Optional[Rom]) -
         cosmetics_log.to_file(cosmetic_path)
         logger.info("Created cosmetic log at: %s" % cosmetic_path)
 
+    if settings.output_timing:
+        timing_path = os.path.join(output_dir, '%s_Timing.json' % output_filename_base)
+        instrumentation.to_file(timing_path)
+        logger.info("Created timing log at: %s" % ('%s_Timing.json' % output_filename_base))
+
     if settings.enable_distribution_file:
         try:
             filename = os.path.join(output_dir, '%s_Distribution.json' % output_filename_base)
@@ -583,7 +722,7 @@ def cosmetic_patch(settings: Settings) -> None:
 
     # clear changes from the base patch file
     patched_base_rom = copy.copy(rom.buffer)
-    rom.changed_address = {}
+    rom.changed_ranges = AddressRanges()
     rom.changed_dma = {}
     rom.force_patch = []
 
@@ -1,8 +1,10 @@
 # text details: https://wiki.cloudmodding.com/oot/Text_Format
 
 from __future__ import annotations
+import copy
 import random
 from collections.abc import Callable, Iterable
+from functools import lru_cache
 from typing import TYPE_CHECKING, Optional, Any
 
 from HintList import misc_item_hint_table, misc_location_hint_table
@@ -690,17 +692,17 @@ class TextCode:
             size += CONTROL_CODES[self.code][1]
         return size
 
-    # writes the code to the given offset, and returns the offset of the next byte
-    def write(self, rom: Rom, text_start: int, offset: int) -> int:
-        rom.write_byte(text_start + offset, self.code)
-
-        extra_bytes = 0
+    # the bytes of the code as they are written to the rom
+    def encode(self) -> bytes:
         if self.code in CONTROL_CODES:
-            extra_bytes = CONTROL_CODES[self.code][1]
-            bytes_to_write = int_to_bytes(self.data, extra_bytes)
-            rom.write_bytes(text_start + offset + 1, bytes_to_write)
+            return bytes((self.code,)) + int_to_bytes(self.data, CONTROL_CODES[self.code][1])
+        return bytes((self.code,))
 
-        return offset + 1 + extra_bytes
+    # writes the code to the given offset, and returns the offset of the next byte
+    def write(self, rom: Rom, text_start: int, offset: int) -> int:
+        code_bytes = self.encode()
+        rom.write_bytes(text_start + offset, code_bytes)
+        return offset + len(code_bytes)
 
     __str__ = __repr__ = display
 
@@ -733,6 +735,7 @@ class Message:
         self.ending: Optional[TextCode] = None
 
         self.text_codes: list[TextCode] = []
+        self.transformed: bool = False  # whether text_codes no longer match raw_text
         self.text: str = ''
         self.unpadded_length: int = 0
         self.parse_text()
@@ -770,6 +773,7 @@ class Message:
 
     def parse_text(self) -> None:
         self.text_codes = parse_control_codes(self.raw_text)
+        self.transformed = False
 
         index = 0
         for text_code in self.text_codes:
@@ -865,25 +869,51 @@ class Message:
             text_codes.append(TextCode(0x02, 0))  # write end code
 
         self.text_codes = text_codes
+        self.transformed = True
+
+    # transforms the message like transform(True, ...) and returns its encoded text
+    # messages that are still as they were parsed are only transformed and encoded once
+    def transform_and_encode(self, ending: Optional[TextCode] = None, always_allow_skip: bool = True,
+                             speed_up_text: bool = True) -> bytes:
+        if self.transformed:
+            self.transform(True, ending, always_allow_skip, speed_up_text)
+            return self.encode()
+        key = (bytes(self.raw_text), self.id, ending and (ending.code, ending.data), always_allow_skip, speed_up_text)
+        if key in transformed_messages:
+            text_codes, text = transformed_messages[key]
+            self.text_codes = list(text_codes)
+            self.transformed = True
+            return text
+        self.transform(True, ending, always_allow_skip, speed_up_text)
+        text = self.encode()
+        if len(transformed_messages) >= TRANSFORMED_MESSAGES_LIMIT:
+            transformed_messages.clear()
+        transformed_messages[key] = (tuple(self.text_codes), text)
+        return text
+
+    # the text of the message as it is written to the rom, padded to 4 byte align
+    def encode(self) -> bytes:
+        text = b''.join([code.encode() for code in self.text_codes])
+        return text + bytes(-len(text) % 4)
+
+    # the table entry of the message, for text at the given offset of the given bank
+    def table_entry(self, offset: int, bank: int) -> bytes:
+        return int_to_bytes(self.id, 2) + bytes([self.opts, 0x00, bank]) + int_to_bytes(offset, 3)
+
+    # a copy that can be changed without changing this message
+    def copy(self) -> Message:
+        message = copy.copy(self)
+        message.raw_text = bytearray(self.raw_text)
+        message.text_codes = list(self.text_codes)
+        return message
 
     # writes a Message back into the rom, using the given index and offset to update the table
     # returns the offset of the next message
     def write(self, rom: Rom, index: int, text_start: int, offset: int, bank: int) -> int:
-        # construct the table entry
-        id_bytes = int_to_bytes(self.id, 2)
-        offset_bytes = int_to_bytes(offset, 3)
-        entry = id_bytes + bytes([self.opts, 0x00, bank]) + offset_bytes
-        # write it back
-        entry_offset = EXTENDED_TABLE_START + 8 * index
-        rom.write_bytes(entry_offset, entry)
-
-        for code in self.text_codes:
-            offset = code.write(rom, text_start, offset)
-
-        while offset % 4 > 0:
-            offset = TextCode(0x00, 0).write(rom, text_start, offset) # pad to 4 byte align
-
-        return offset
+        rom.write_bytes(EXTENDED_TABLE_START + 8 * index, self.table_entry(offset, bank))
+        text = self.encode()
+        rom.write_bytes(text_start + offset, text)
+        return offset + len(text)
 
     # read a single message from rom
     @classmethod
@@ -918,9 +948,9 @@ class Message:
         offset = bytes_to_int(entry[5:8])
         length = bytes_to_int(next[5:8]) - offset
 
-        raw_text = rom.read_bytes(text_start + offset, length)
+        raw_text = bytes(rom.read_bytes(text_start + offset, length))
 
-        return cls(raw_text, index, id, opts, offset, length)
+        return parse_message(raw_text, index, id, opts, offset, length).copy()
 
     @classmethod
     def from_string(cls, text: str, id: int = 0, opts: int = 0x00) -> Message:
@@ -935,6 +965,19 @@ class Message:
     __str__ = __repr__ = display
 
 
+# Every world and every patched rom reads the same messages of the base rom, so they are parsed
+# once, by everything they are made from. Callers get copies, which they are free to change.
+@lru_cache(maxsize=0x2000)
+def parse_message(raw_text: bytes, index: int, id: int, opts: int, offset: int, length: int) -> Message:
+    return Message(bytearray(raw_text), index, id, opts, offset, length)
+
+
+# The transformed text codes and encoded text of messages that weren't changed since they were
+# parsed, by their text, id, ending, and the transform options.
+TRANSFORMED_MESSAGES_LIMIT: int = 0x4000
+transformed_messages: dict[tuple[bytes, int, Optional[tuple[int, int]], bool, bool], tuple[tuple[TextCode, ...], bytes]] = {}
+
+
 # wrapper for updating the text of a message, given its message id
 # if the id does not exist in the list, then it will add it
 # Checks if the message being updated is a newly added message in order to prevent duplicates.
@@ -1237,6 +1280,7 @@ def read_fffc_message(rom: Rom) -> Message:
 
 
 # write the messages back
+# the text of each file and the table are put together first, and each written at once
 def repack_messages(rom: Rom, messages: list[Message], permutation: Optional[list[int]] = None,
                     always_allow_skip: bool = True, speed_up_text: bool = True) -> None:
     rom.update_dmadata_record_by_key(ENG_TEXT_START, ENG_TEXT_START, ENG_TEXT_START + ENG_TEXT_SIZE_LIMIT)
@@ -1246,16 +1290,18 @@ def repack_messages(rom: Rom, messages: list[Message], permutation: Optional[lis
         permutation = range(len(messages))
 
     # repack messages
-    offset = 0
+    table = bytearray()
+    jp_text = bytearray()
+    text = jp_text
     text_start = JPN_TEXT_START
     text_size_limit = EXTENDED_TEXT_SIZE_LIMIT
     text_bank = 0x08 # start with the Japanese text bank
     jp_bytes = 0
-    # An extra dummy message is inserted after exhausting the JP text file.
+    # An extra dummy message is inserted after exhausting the JP text file,
+    # so the table entries after it are one past the message's index.
     # Written message IDs are independent of the python list index, but the
     # index has to be maintained for old/new lookups. This wouldn't be an
     # issue if text shuffle didn't exist.
-    jp_index_offset = 0
 
     for old_index, new_index in enumerate(permutation):
         old_message = messages[old_index]
@@ -1265,11 +1311,13 @@ def repack_messages(rom: Rom, messages: list[Message], permutation: Optional[lis
 
         # modify message, making it represent how we want it to be written
         if new_message.id != 0xFFFC:
-            new_message.transform(True, old_message.ending, always_allow_skip, speed_up_text)
+            message_text = new_message.transform_and_encode(old_message.ending, always_allow_skip, speed_up_text)
+        else:
+            message_text = new_message.encode()
 
         # check if there is space to write the message
-        message_size = new_message.size()
-        if message_size + offset > JPN_TEXT_SIZE_LIMIT and text_start == JPN_TEXT_START:
+        offset = len(text)
+        if len(message_text) + offset > JPN_TEXT_SIZE_LIMIT and text_start == JPN_TEXT_START:
             # Add a dummy entry to the table for the last entry in the
             # JP file. This is used by the game to calculate message
             # length. Since the next entry in the English table has an
@@ -1277,51 +1325,52 @@ def repack_messages(rom: Rom, messages: list[Message], permutation: Optional[lis
             # 0xFFFD is used as the text ID for this in vanilla.
             # Text IDs need to be in order across the table for the
             # split to work.
-            entry = bytes([0xFF, 0xFD, 0x00, 0x00, text_bank]) + int_to_bytes(offset, 3)
-            entry_offset = EXTENDED_TABLE_START + 8 * old_index
-            rom.write_bytes(entry_offset, entry)
+            table += bytes([0xFF, 0xFD, 0x00, 0x00, text_bank]) + int_to_bytes(offset, 3)
             # if there is no room then switch to the English text bank
             text_bank = 0x07
             text_start = ENG_TEXT_START
             jp_bytes = offset
-            jp_index_offset = 1
+            text = bytearray()
             offset = 0
 
         # Special handling for text ID 0xFFFC, which has hard-coded offsets to
         # the JP file in function Font_LoadOrderedFont in z_kanfont.c
         if new_message.id == 0xFFFC:
+            end = offset + len(message_text)
             # hard-coded offset including segment
             rom.write_int16(0xAD1CE2, (text_bank << 8) + ((offset & 0xFFFF0000) >> 16) + (1 if offset & 0xFFFF > 0x8000 else 0))
             rom.write_int16(0xAD1CE6, offset & 0XFFFF)
             # hard-coded message length, represented by offset of end of message
-            rom.write_int16(0xAD1D16, (text_bank << 8) + (((offset + new_message.size()) & 0xFFFF0000) >> 16) + (1 if (offset + new_message.size()) & 0xFFFF > 0x8000 else 0))
-            rom.write_int16(0xAD1D1E, (offset + new_message.size()) & 0XFFFF)
+            rom.write_int16(0xAD1D16, (text_bank << 8) + ((end & 0xFFFF0000) >> 16) + (1 if end & 0xFFFF > 0x8000 else 0))
+            rom.write_int16(0xAD1D1E, end & 0XFFFF)
             # hard-coded segment, default JP file (0x08)
             rom.write_int16(0xAD1D12, (text_bank << 8))
             # hard-coded text file start address in rom, default JP
             rom.write_int16(0xAD1D22, ((text_start & 0xFFFF0000) >> 16) + (1 if text_start & 0xFFFF > 0x8000 else 0))
             rom.write_int16(0xAD1D2E, text_start & 0XFFFF)
 
-        # actually write the message
-        offset = new_message.write(rom, old_index + jp_index_offset, text_start, offset, text_bank)
+        # add the message
+        table += new_message.table_entry(offset, text_bank)
+        text += message_text
 
         new_message.id = remember_id
 
     # raise an exception if too much is written
     # we raise it at the end so that we know how much overflow there is
+    offset = len(text)
     if jp_bytes + offset > text_size_limit:
         raise(TypeError("Message Text table is too large: 0x" + "{:x}".format(jp_bytes + offset) + " written / 0x" + "{:x}".format(EXTENDED_TEXT_SIZE_LIMIT) + " allowed."))
 
     # end the table, accounting for additional entry for file split
-    table_index = len(messages) + (1 if text_bank == 0x07 else 0)
-    entry = bytes([0xFF, 0xFD, 0x00, 0x00, text_bank]) + int_to_bytes(offset, 3)
-    entry_offset = EXTENDED_TABLE_START + 8 * table_index
-    rom.write_bytes(entry_offset, entry)
-    table_index += 1
-    entry_offset = EXTENDED_TABLE_START + 8 * table_index
-    if 8 * (table_index + 1) > EXTENDED_TABLE_SIZE:
-        raise(TypeError("Message ID table is too large: 0x" + "{:x}".format(8 * (table_index + 1)) + " written / 0x" + "{:x}".format(EXTENDED_TABLE_SIZE) + " allowed."))
-    rom.write_bytes(entry_offset, [0xFF, 0xFF, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
+    table += bytes([0xFF, 0xFD, 0x00, 0x00, text_bank]) + int_to_bytes(offset, 3)
+    table += bytes([0xFF, 0xFF, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
+    if len(table) > EXTENDED_TABLE_SIZE:
+        raise(TypeError("Message ID table is too large: 0x" + "{:x}".format(len(table)) + " written / 0x" + "{:x}".format(EXTENDED_TABLE_SIZE) + " allowed."))
+
+    rom.write_bytes(JPN_TEXT_START, jp_text)
+    if text_start == ENG_TEXT_START:
+        rom.write_bytes(ENG_TEXT_START, text)
+    rom.write_bytes(EXTENDED_TABLE_START, table)
 
 
 # shuffles the messages in the game, making sure to keep various message types in their own group
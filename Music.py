@@ -252,14 +252,13 @@ def rebuild_sequences(rom: Rom, sequences: list[Sequence], log: CosmeticsLog, sy
     creditlist = [sequence_id for title, sequence_id in credit_sequence_ids]
     fileselectlist = [sequence_id for title, sequence_id in fileselect_sequence_id]
 
-    for i in range(0x6E):
+    # Read the address and size of every entry of the pointer table
+    pointer_table = rom.read_structs(0xB89AE0, '>II8x', 0x6E)
+    for i, (sequence_address, sequence_size) in enumerate(pointer_table):
         # Create new sequence object, an entry for the audio sequence
         entry = SequenceData()
-        # Get the address for the entry's pointer table entry
-        entry_address = 0xB89AE0 + (i * 0x10)
-        # Extract the info from the pointer table entry
-        entry.address = rom.read_int32(entry_address)
-        entry.size = rom.read_int32(entry_address + 0x04)
+        entry.address = sequence_address
+        entry.size = sequence_size
 
         # If size > 0, read the sequence data from the rom into the sequence object
         if entry.size > 0:
@@ -341,7 +340,7 @@ def rebuild_sequences(rom: Rom, sequences: list[Sequence], log: CosmeticsLog, sy
     # Check if the new audio sequence is larger than the vanilla one
     if address > audioseq_size:
         # Zero out the old audio sequence
-        rom.buffer[audioseq_start:audioseq_end] = [0] * audioseq_size
+        rom.buffer[audioseq_start:audioseq_end] = bytes(audioseq_size)
 
         # Find free space and update dmatable
         new_address = rom.dma.free_space(address)
@@ -356,8 +355,7 @@ def rebuild_sequences(rom: Rom, sequences: list[Sequence], log: CosmeticsLog, sy
 
     # Update pointer table
     for i in range(0x6E):
-        rom.write_int32(0xB89AE0 + (i * 0x10), new_sequences[i].address)
-        rom.write_int32(0xB89AE0 + (i * 0x10) + 0x04, new_sequences[i].size)
+        rom.write_int32s(0xB89AE0 + (i * 0x10), [new_sequences[i].address, new_sequences[i].size])
         seq = replacement_dict.get(i, None)
 
     # Update instrument sets for bgm sequences
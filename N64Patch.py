@@ -1,12 +1,13 @@
 from __future__ import annotations
-import copy
 import random
+import struct
 import zipfile
 import zlib
+from collections.abc import Callable
 from typing import TYPE_CHECKING, Optional
 
-from Rom import Rom
-from ntype import BigStream
+from Rom import Rom, AddressRanges, find_changed_ranges
+from ntype import BigStream, uint24
 
 if TYPE_CHECKING:
     from Settings import Settings
@@ -25,158 +26,221 @@ def key_next(rom: Rom, key_address: int, address_range: tuple[int, int]) -> tupl
     return key, key_address
 
 
+# The XOR keys of a patch in the order they are used: the non-0 bytes of the source rom
+# within the key range, starting after the key address and wrapping around at the end.
+# Equivalent to calling key_next for every key, but handing out keys in bulk.
+class XorKeyStream:
+    def __init__(self, rom: Rom, xor_range: tuple[int, int], key_address: int) -> None:
+        key_bytes = bytes(rom.original.buffer[xor_range[0]:xor_range[1] + 1])
+        self.keys: bytes = key_bytes.replace(b'\x00', b'')
+        if not self.keys:
+            raise Exception("XOR key range of the patch only contains 0s.")
+        # the next key is the first non-0 byte after the key address
+        skipped = key_bytes[:key_address + 1 - xor_range[0]]
+        self.index: int = (len(skipped) - skipped.count(0)) % len(self.keys)
+
+    def skip(self, count: int) -> None:
+        self.index = (self.index + count) % len(self.keys)
+
+    def take(self, count: int) -> bytes:
+        keys = self.keys[self.index:self.index + count]
+        while len(keys) < count:
+            keys += self.keys[:count - len(keys)]
+        self.skip(count)
+        return keys
+
+    # XORs the non-0 bytes of data with the next keys, leaving 0s as they are.
+    def xor(self, data: bytes) -> bytes:
+        non_zero = data.replace(b'\x00', b'')
+        keys = self.take(len(non_zero))
+        result = (int.from_bytes(non_zero, 'big') ^ int.from_bytes(keys, 'big')).to_bytes(len(non_zero), 'big')
+        if len(non_zero) == len(data):
+            return result
+        # put the 0s back in between the XORed runs of non-0 bytes
+        runs = []
+        position = 0
+        for run in data.split(b'\x00'):
+            runs.append(result[position:position + len(run)])
+            position += len(run)
+        return b'\x00'.join(runs)
+
+
 # creates a XOR block for the patch. This might break it up into
 # multiple smaller blocks if there is a concern about the XOR key
 # or if it is too long.
-def write_block(rom: Rom, xor_address: int, xor_range: tuple[int, int], block_start: int,
-                data: list[int], patch_data: BigStream) -> int:
-    new_data = []
+def write_block(keys: XorKeyStream, block_start: int, data: bytes, write: Callable[[bytes], None]) -> None:
+    new_data = bytearray()
     key_offset = 0
     continue_block = False
 
-    for b in data:
-        if b == 0:
-            # Leave 0s as 0s. Do not XOR
-            new_data += [0]
-        else:
-            # get the next XOR key
-            key, xor_address = key_next(rom, xor_address, xor_range)
-
+    position = 0
+    while position < len(data):
+        # XOR the data a window at a time, up to the first byte that would XOR to 0
+        window = data[position:position + min(XOR_WINDOW, 0xFFFF - len(new_data))]
+        key_index = keys.index
+        xored = keys.xor(window)
+        safe = len(window)
+        if xored.count(0) != window.count(0):
+            safe = first_difference(window.translate(NON_ZERO), xored.translate(NON_ZERO))
+            keys.index = key_index
+            keys.skip(safe - window.count(0, 0, safe))
+        new_data += xored[:safe]
+        position += safe
+
+        if safe < len(window):
             # if the XOR would result in 0, change the key.
             # This requires breaking up the block.
-            if b == key:
-                write_block_section(block_start, key_offset, new_data, patch_data, continue_block)
-                new_data = []
-                key_offset = 0
-                continue_block = True
-
-                # search for next safe XOR key
-                while b == key:
-                    key_offset += 1
-                    key, xor_address = key_next(rom, xor_address, xor_range)
-                    # if we aren't able to find one quickly, we may need to break again
-                    if key_offset == 0xFF:
-                        write_block_section(block_start, key_offset, new_data, patch_data, continue_block)
-                        new_data = []
-                        key_offset = 0
-                        continue_block = True
+            b = data[position]
+            key = keys.take(1)[0]
+            write_block_section(block_start, key_offset, new_data, write, continue_block)
+            new_data = bytearray()
+            key_offset = 0
+            continue_block = True
+
+            # search for next safe XOR key
+            while b == key:
+                key_offset += 1
+                key = keys.take(1)[0]
+                # if we aren't able to find one quickly, we may need to break again
+                if key_offset == 0xFF:
+                    write_block_section(block_start, key_offset, new_data, write, continue_block)
+                    key_offset = 0
 
             # XOR the key with the byte
-            new_data += [b ^ key]
+            new_data.append(b ^ key)
+            position += 1
 
-            # Break the block if it's too long
-            if len(new_data) == 0xFFFF:
-                write_block_section(block_start, key_offset, new_data, patch_data, continue_block)
-                new_data = []
-                key_offset = 0
-                continue_block = True
+        # Break the block if it's too long
+        if len(new_data) == 0xFFFF:
+            write_block_section(block_start, key_offset, new_data, write, continue_block)
+            new_data = bytearray()
+            key_offset = 0
+            continue_block = True
 
     # Save the block
-    write_block_section(block_start, key_offset, new_data, patch_data, continue_block)
-    return xor_address
+    write_block_section(block_start, key_offset, new_data, write, continue_block)
+
+
+# Blocks are XORed this many bytes at a time. A key matches a byte about once every 255
+# bytes, after which the rest of the window is XORed again with the next keys.
+XOR_WINDOW: int = 0x100
+# Maps 0 to 0 and everything else to 1.
+NON_ZERO: bytes = bytes([0] + [1] * 0xFF)
+
+
+# Returns the index of the first byte that differs between two different bytes objects of the same length.
+def first_difference(data: bytes, other_data: bytes) -> int:
+    difference = int.from_bytes(data, 'big') ^ int.from_bytes(other_data, 'big')
+    return len(data) - 1 - (difference.bit_length() - 1) // 8
 
 
 # This saves a sub-block for the XOR block. If it's the first part
 # then it will include the address to write to. Otherwise, it will
 # have a number of XOR keys to skip and then continue writing after
 # the previous block
-def write_block_section(start: int, key_skip: int, in_data: list[int], patch_data: BigStream, is_continue: bool) -> None:
+def write_block_section(start: int, key_skip: int, in_data: bytes, write: Callable[[bytes], None], is_continue: bool) -> None:
     if not is_continue:
-        patch_data.append_int32(start)
+        write(struct.pack('>IH', start, len(in_data)))
     else:
-        patch_data.append_bytes([0xFF, key_skip])
-    patch_data.append_int16(len(in_data))
-    patch_data.append_bytes(in_data)
+        write(struct.pack('>BBH', 0xFF, key_skip, len(in_data)))
+    write(in_data)
 
 
 # This will create the patch file. Which can be applied to a source rom.
 # xor_range is the range the XOR key will read from. This range is not
 # too important, but I tried to choose from a section that didn't really
 # have big gaps of 0s which we want to avoid.
+# The patch is compressed while it's written, so only one block is in memory at a time.
 def create_patch_file(rom: Rom, file: str, xor_range: tuple[int, int] = (0x00B8AD30, 0x00F029A0)) -> None:
     dma_start, dma_end = rom.dma.dma_start, rom.dma.dma_end
 
-    # add header
-    patch_data = BigStream(bytearray())
-    patch_data.append_bytes(list(map(ord, 'ZPFv1')))
-    patch_data.append_int32(dma_start)
-    patch_data.append_int32(xor_range[0])
-    patch_data.append_int32(xor_range[1])
-
-    # get random xor key. This range is chosen because it generally
-    # doesn't have many sections of 0s
-    xor_address = random.Random().randint(*xor_range)
-    patch_data.append_int32(xor_address)
-
-    new_buffer = copy.copy(rom.original.buffer)
-
-    # write every changed DMA entry
-    for dma_index, (from_file, start, size) in rom.changed_dma.items():
-        patch_data.append_int16(dma_index)
-        patch_data.append_int32(from_file)
-        patch_data.append_int32(start)
-        patch_data.append_int24(size)
-
-        # We don't trust files that have modified DMA to have their
-        # changed addresses tracked correctly, so we invalidate the
-        # entire file
-        for address in range(start, start + size):
-            rom.changed_address[address] = rom.buffer[address]
-
-        # Simulate moving the files to know which addresses have changed
-        if from_file >= 0:
-            old_dma_start, old_dma_end, old_size = rom.original.dma.get_dmadata_record_by_key(from_file).as_tuple()
-            copy_size = min(size, old_size)
-            new_buffer[start:start+copy_size] = rom.original.read_bytes(from_file, copy_size)
-            new_buffer[start+copy_size:start+size] = [0] * (size - copy_size)
-        else:
-            # this is a new file, so we just fill with null data
-            new_buffer[start:start+size] = [0] * size
-
-    # end of DMA entries
-    patch_data.append_int16(0xFFFF)
-
-    # filter down the addresses that will actually need to change.
-    # Make sure to not include any of the DMA table addresses
-    changed_addresses = [address for address, value in rom.changed_address.items()
-                         if (address >= dma_end or address < dma_start) and
-                         (address in rom.force_patch or new_buffer[address] != value)]
-    changed_addresses.sort()
-
-    # Write the address changes. We'll store the data with XOR so that
-    # the patch data won't be raw data from the patched rom.
-    data = []
-    block_start = block_end = None
-    BLOCK_HEADER_SIZE = 7  # this is used to break up gaps
-    for address in changed_addresses:
-        # if there's a block to write and there's a gap, write it
-        if block_start:
-            block_end = block_start + len(data) - 1
-            if address > block_end + BLOCK_HEADER_SIZE:
-                xor_address = write_block(rom, xor_address, xor_range, block_start, data, patch_data)
-                data = []
+    with open(file, 'wb') as outfile:
+        compressor = zlib.compressobj()
+
+        def write(data: bytes) -> None:
+            outfile.write(compressor.compress(data))
+
+        # add header
+        write(b'ZPFv1')
+        write(struct.pack('>III', dma_start, xor_range[0], xor_range[1]))
+
+        # get random xor key. This range is chosen because it generally
+        # doesn't have many sections of 0s
+        xor_address = random.Random().randint(*xor_range)
+        write(struct.pack('>I', xor_address))
+
+        # write every changed DMA entry
+        moved_files = []
+        for dma_index, (from_file, start, size) in rom.changed_dma.items():
+            write(struct.pack('>HII', dma_index, from_file & 0xFFFFFFFF, start) + uint24.bytes(size))
+
+            # We don't trust files that have modified DMA to have their
+            # changed addresses tracked correctly, so we invalidate the
+            # entire file
+            rom.changed_ranges.add(start, start + size)
+
+            # Simulate moving the files to know which addresses have changed
+            if from_file >= 0:
+                old_dma_start, old_dma_end, old_size = rom.original.dma.get_dmadata_record_by_key(from_file).as_tuple()
+                copy_size = min(size, old_size)
+                moved_files.append((start, bytes(rom.original.read_bytes(from_file, copy_size)) + bytes(size - copy_size)))
+            else:
+                # this is a new file, so we just fill with null data
+                moved_files.append((start, bytes(size)))
+
+        # end of DMA entries
+        write(struct.pack('>H', 0xFFFF))
+
+        # filter down the addresses that will actually need to change.
+        # Make sure to not include any of the DMA table addresses
+        tracked = rom.changed_ranges.copy()
+        tracked.remove(dma_start, dma_end)
+        changed = AddressRanges()
+        rom_size = min(len(rom.buffer), len(rom.original.buffer))
+        for start, end in tracked:
+            for chunk_start in range(start, min(end, rom_size), COMPARE_CHUNK_SIZE):
+                chunk_end = min(chunk_start + COMPARE_CHUNK_SIZE, end, rom_size)
+                original = original_bytes(rom, moved_files, chunk_start, chunk_end)
+                for changed_start, changed_end in find_changed_ranges(rom.buffer[chunk_start:chunk_end], original, 0, chunk_end - chunk_start):
+                    changed.add(chunk_start + changed_start, chunk_start + changed_end)
+        for address in rom.force_patch:
+            if address in tracked:
+                changed.add(address, address + 1)
+
+        # Write the address changes. We'll store the data with XOR so that
+        # the patch data won't be raw data from the patched rom.
+        # Changes with gaps of up to a block header in between share a block.
+        keys = XorKeyStream(rom, xor_range, xor_address)
+        block_start = block_end = None
+        BLOCK_HEADER_SIZE = 7  # this is used to break up gaps
+        for start, end in changed:
+            # if there's a block to write and there's a gap, write it
+            if block_start is not None and start > block_end - 1 + BLOCK_HEADER_SIZE:
+                write_block(keys, block_start, bytes(rom.buffer[block_start:block_end]), write)
                 block_start = None
-                block_end = None
+            if block_start is None:
+                block_start = start
+            block_end = end
 
-        # start a new block
-        if not block_start:
-            block_start = address
-            block_end = address - 1
+        # if there was any leftover blocks, write them out
+        if block_start is not None:
+            write_block(keys, block_start, bytes(rom.buffer[block_start:block_end]), write)
 
-        # save the new data
-        data += rom.buffer[block_end+1:address+1]
+        outfile.write(compressor.flush())
 
-    # if there was any leftover blocks, write them out
-    if block_start:
-        xor_address = write_block(rom, xor_address, xor_range, block_start, data, patch_data)
 
-    # compress the patch file
-    patch_data = bytes(patch_data.buffer)
-    patch_data = zlib.compress(patch_data)
+COMPARE_CHUNK_SIZE: int = 0x100000
 
-    # save the patch file
-    with open(file, 'wb') as outfile:
-        outfile.write(patch_data)
+
+# The bytes of the original rom between start and end, after the DMA files were moved.
+def original_bytes(rom: Rom, moved_files: list[tuple[int, bytes]], start: int, end: int) -> bytearray:
+    original = bytearray(rom.original.buffer[start:end])
+    for file_start, file_data in moved_files:
+        overlap_start = max(start, file_start)
+        overlap_end = min(end, file_start + len(file_data))
+        if overlap_start < overlap_end:
+            original[overlap_start - start:overlap_end - start] = file_data[overlap_start - file_start:overlap_end - file_start]
+    return original
 
 
 # This will apply a patch file to a source rom to generate a patched rom.
@@ -238,12 +302,13 @@ def apply_patch_file(rom: Rom, settings: Settings, sub_file: Optional[str] = Non
             old_dma_start, old_dma_end, old_size = rom.original.dma.get_dmadata_record_by_key(from_file).as_tuple()
             copy_size = min(size, old_size)
             rom.write_bytes(start, rom.original.read_bytes(from_file, copy_size))
-            rom.buffer[start+copy_size:start+size] = [0] * (size - copy_size)
+            rom.buffer[start+copy_size:start+size] = bytes(size - copy_size)
         else:
             # if it's a new file, fill with 0s
-            rom.buffer[start:start+size] = [0] * size
+            rom.buffer[start:start+size] = bytes(size)
 
     # Read in the XOR data blocks. This goes to the end of the file.
+    keys = XorKeyStream(rom, xor_range, xor_address)
     block_start = 0
     while not patch_data.eof():
         is_new_block = patch_data.read_byte() != 0xFF
@@ -258,19 +323,10 @@ def apply_patch_file(rom: Rom, settings: Settings, sub_file: Optional[str] = Non
             key_skip = patch_data.read_byte()
             block_size = patch_data.read_int16()
             # skip specified XOR keys
-            for _ in range(key_skip):
-                key, xor_address = key_next(rom, xor_address, xor_range)
-
-        # read in the new data
-        data = []
-        for b in patch_data.read_bytes(length=block_size):
-            if b == 0:
-                # keep 0s as 0s
-                data += [0]
-            else:
-                # The XOR will always be safe and will never produce 0
-                key, xor_address = key_next(rom, xor_address, xor_range)
-                data += [b ^ key]
+            keys.skip(key_skip)
+
+        # read in the new data. 0s are kept as 0s, and the XOR will never produce 0
+        data = keys.xor(bytes(patch_data.read_bytes(length=block_size)))
 
         # Save the new data to rom
         if settings.repatch_cosmetics:
@@ -11,10 +11,10 @@ import time
 
 
 def start() -> None:
-    from Main import main, from_patch_file, cosmetic_patch, diff_roms
+    from Main import main, main_batch, from_patch_file, cosmetic_patch, diff_roms
     from Settings import get_settings_from_command_line_args
     from Utils import check_version, VersionError, local_path
-    settings, gui, args_loglevel, no_log_file, diff_rom = get_settings_from_command_line_args()
+    settings, gui, args_loglevel, no_log_file, diff_rom, server_port = get_settings_from_command_line_args()
 
     # set up logger
     loglevel = {'error': logging.ERROR, 'info': logging.INFO, 'warning': logging.WARNING, 'debug': logging.DEBUG}[args_loglevel]
@@ -42,12 +42,18 @@ def start() -> None:
         if gui:
             from Gui import gui_main
             gui_main()
+        elif server_port is not None:
+            from Server import serve
+            serve(settings, server_port)
         elif diff_rom:
             diff_roms(settings, diff_rom)
         elif settings.cosmetics_only:
             cosmetic_patch(settings)
         elif settings.patch_file != '':
             from_patch_file(settings)
+        elif settings.count is not None and settings.count > 1 and settings.generation_workers > 1:
+            if main_batch(settings):
+                sys.exit(1)
         elif settings.count is not None and settings.count > 1:
             orig_seed = settings.seed
             for i in range(settings.count):
@@ -25,7 +25,7 @@ from Messages import read_messages, update_message_by_id, read_shop_items, updat
         get_message_by_id, TextCode, new_messages, COLOR_MAP
 from OcarinaSongs import patch_songs
 from MQ import patch_files, File, update_dmadata, insert_space, add_relocations
-from Rom import Rom
+from Rom import Rom, AddressRanges
 from SaveContext import SaveContext, Scenes, FlagType
 from SceneFlags import build_xflag_tables, build_xflags_from_world, get_alt_list_bytes
 from Sounds import move_audiobank_table
@@ -2533,79 +2533,117 @@ chestTypeMap: dict[int, list[int]] = {
 }
 
 
-def room_get_actors(rom: Rom, actor_func: Callable[[Rom, int, int, int], Any], room_data: int, scene: int,
-                    alternate: Optional[int] = None) -> dict[int, Any]:
-    actors = {}
-    room_start = alternate if alternate else room_data
-    command = 0
-    while command != 0x14:  # 0x14 = end header
-        command = rom.read_byte(room_data)
-        if command == 0x01:  # actor list
-            actor_count = rom.read_byte(room_data + 1)
-            actor_list = room_start + (rom.read_int32(room_data + 4) & 0x00FFFFFF)
-            for _ in range(0, actor_count):
-                actor_id = rom.read_int16(actor_list)
-                entry = actor_func(rom, actor_id, actor_list, scene)
-                if entry:
-                    actors[actor_list] = entry
-                actor_list = actor_list + 16
-        if command == 0x18:  # Alternate header list
-            header_list = room_start + (rom.read_int32(room_data + 4) & 0x00FFFFFF)
-            for alt_id in range(0, 3):
-                header_data = room_start + (rom.read_int32(header_list) & 0x00FFFFFF)
-                if header_data != 0 and not alternate:
-                    actors.update(room_get_actors(rom, actor_func, header_data, scene, room_start))
-                header_list = header_list + 4
-        room_data = room_data + 8
-    return actors
-
-
-def scene_get_actors(rom: Rom, actor_func: Callable[[Rom, int, int, int], Any], scene_data: int, scene: int,
-                     alternate: Optional[int] = None, processed_rooms: Optional[list[int]] = None) -> dict[int, Any]:
-    if processed_rooms is None:
-        processed_rooms = []
-    actors = {}
-    scene_start = alternate if alternate else scene_data
-    command = 0
-    while command != 0x14:  # 0x14 = end header
-        command = rom.read_byte(scene_data)
-        if command == 0x04:  # room list
-            room_count = rom.read_byte(scene_data + 1)
-            room_list = scene_start + (rom.read_int32(scene_data + 4) & 0x00FFFFFF)
-            for _ in range(0, room_count):
-                room_data = rom.read_int32(room_list)
-
-                if room_data not in processed_rooms:
-                    actors.update(room_get_actors(rom, actor_func, room_data, scene))
-                    processed_rooms.append(room_data)
-                room_list = room_list + 8
-        if command == 0x0E:  # transition actor list
-            actor_count = rom.read_byte(scene_data + 1)
-            actor_list = scene_start + (rom.read_int32(scene_data + 4) & 0x00FFFFFF)
-            for _ in range(0, actor_count):
-                actor_id = rom.read_int16(actor_list + 4)
-                entry = actor_func(rom, actor_id, actor_list, scene)
-                if entry:
-                    actors[actor_list] = entry
-                actor_list = actor_list + 16
-        if command == 0x18:  # Alternate header list
-            header_list = scene_start + (rom.read_int32(scene_data + 4) & 0x00FFFFFF)
-            for alt_id in range(0, 3):
-                header_data = scene_start + (rom.read_int32(header_list) & 0x00FFFFFF)
-                if header_data != 0 and not alternate:
-                    actors.update(scene_get_actors(rom, actor_func, header_data, scene, scene_start, processed_rooms))
-                header_list = header_list + 4
-
-        scene_data = scene_data + 8
-    return actors
-
-
+# Every actor in the actor lists of every scene and room, in the order the scene and room headers are
+# walked, including actors that are reached again through an alternate header. Walking the headers
+# is what makes finding actors slow, so the index is kept and reused for as long as the bytes the
+# walk read stay the same.
+class ActorIndex:
+    def __init__(self, rom: Rom) -> None:
+        # (actor id, address of the actor entry, scene) for every actor the walk reaches.
+        self.actors: list[tuple[int, int, int]] = []
+        self.read_ranges: AddressRanges = AddressRanges()
+        scene_table = 0x00B71440
+        for scene in range(0x00, 0x65):
+            scene_data = self.read_int32(rom, scene_table + (scene * 0x14))
+            self.scene_get_actors(rom, scene_data, scene)
+        self.read_data: bytes = self.read_bytes(rom)
+
+    def read_byte(self, rom: Rom, address: int) -> int:
+        self.read_ranges.add(address, address + 1)
+        return rom.read_byte(address)
+
+    def read_int16(self, rom: Rom, address: int) -> int:
+        self.read_ranges.add(address, address + 2)
+        return rom.read_int16(address)
+
+    def read_int32(self, rom: Rom, address: int) -> int:
+        self.read_ranges.add(address, address + 4)
+        return rom.read_int32(address)
+
+    # The bytes the walk read, which decide every actor and its id.
+    def read_bytes(self, rom: Rom) -> bytes:
+        return b''.join(rom.buffer[start:end] for start, end in self.read_ranges)
+
+    def is_valid(self, rom: Rom) -> bool:
+        return self.read_bytes(rom) == self.read_data
+
+    def room_get_actors(self, rom: Rom, room_data: int, scene: int, alternate: Optional[int] = None) -> None:
+        room_start = alternate if alternate else room_data
+        command = 0
+        while command != 0x14:  # 0x14 = end header
+            command = self.read_byte(rom, room_data)
+            if command == 0x01:  # actor list
+                actor_count = self.read_byte(rom, room_data + 1)
+                actor_list = room_start + (self.read_int32(rom, room_data + 4) & 0x00FFFFFF)
+                for _ in range(0, actor_count):
+                    self.actors.append((self.read_int16(rom, actor_list), actor_list, scene))
+                    actor_list = actor_list + 16
+            if command == 0x18:  # Alternate header list
+                header_list = room_start + (self.read_int32(rom, room_data + 4) & 0x00FFFFFF)
+                for alt_id in range(0, 3):
+                    header_data = room_start + (self.read_int32(rom, header_list) & 0x00FFFFFF)
+                    if header_data != 0 and not alternate:
+                        self.room_get_actors(rom, header_data, scene, room_start)
+                    header_list = header_list + 4
+            room_data = room_data + 8
+
+    def scene_get_actors(self, rom: Rom, scene_data: int, scene: int, alternate: Optional[int] = None,
+                         processed_rooms: Optional[list[int]] = None) -> None:
+        if processed_rooms is None:
+            processed_rooms = []
+        scene_start = alternate if alternate else scene_data
+        command = 0
+        while command != 0x14:  # 0x14 = end header
+            command = self.read_byte(rom, scene_data)
+            if command == 0x04:  # room list
+                room_count = self.read_byte(rom, scene_data + 1)
+                room_list = scene_start + (self.read_int32(rom, scene_data + 4) & 0x00FFFFFF)
+                for _ in range(0, room_count):
+                    room_data = self.read_int32(rom, room_list)
+
+                    if room_data not in processed_rooms:
+                        self.room_get_actors(rom, room_data, scene)
+                        processed_rooms.append(room_data)
+                    room_list = room_list + 8
+            if command == 0x0E:  # transition actor list
+                actor_count = self.read_byte(rom, scene_data + 1)
+                actor_list = scene_start + (self.read_int32(rom, scene_data + 4) & 0x00FFFFFF)
+                for _ in range(0, actor_count):
+                    self.actors.append((self.read_int16(rom, actor_list + 4), actor_list, scene))
+                    actor_list = actor_list + 16
+            if command == 0x18:  # Alternate header list
+                header_list = scene_start + (self.read_int32(rom, scene_data + 4) & 0x00FFFFFF)
+                for alt_id in range(0, 3):
+                    header_data = scene_start + (self.read_int32(rom, header_list) & 0x00FFFFFF)
+                    if header_data != 0 and not alternate:
+                        self.scene_get_actors(rom, header_data, scene, scene_start, processed_rooms)
+                    header_list = header_list + 4
+
+            scene_data = scene_data + 8
+
+
+# The indexes of the last few ROM images, since patching MQ dungeons changes the scenes partway
+# through patching, and the next world is patched starting from vanilla scenes again.
+actor_indexes: list[ActorIndex] = []
+
+
+def get_actor_index(rom: Rom) -> ActorIndex:
+    for actor_index in actor_indexes:
+        if actor_index.is_valid(rom):
+            return actor_index
+    actor_index = ActorIndex(rom)
+    actor_indexes.insert(0, actor_index)
+    del actor_indexes[4:]
+    return actor_index
+
+
+# Calls actor_func for every actor in every scene, returning the results that aren't empty by actor address.
 def get_actor_list(rom: Rom, actor_func: Callable[[Rom, int, int, int], Any]) -> dict[int, Any]:
     actors = {}
-    scene_table = 0x00B71440
-    for scene in range(0x00, 0x65):
-        scene_data = rom.read_int32(scene_table + (scene * 0x14))
-        actors.update(scene_get_actors(rom, actor_func, scene_data, scene))
+    for actor_id, actor, scene in get_actor_index(rom).actors:
+        entry = actor_func(rom, actor_id, actor, scene)
+        if entry:
+            actors[actor] = entry
     return actors
 
 
@@ -3,8 +3,12 @@ import copy
 import json
 import os
 import platform
+import re
+import struct
 import subprocess
-from collections.abc import Iterator, Sequence
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator, Sequence
+from functools import lru_cache
 from typing import Optional
 
 from Models import restrictiveBytes
@@ -15,6 +19,8 @@ from version import base_version, branch_identifier, supplementary_version
 
 DMADATA_START: int = 0x7430  # NTSC 1.0/1.1: 0x7430, NTSC 1.2: 0x7960, Debug: 0x012F70
 
+changed_bytes: re.Pattern[bytes] = re.compile(rb'[^\x00]+')
+
 
 class Rom(BigStream):
     def __init__(self, file: Optional[str] = None, *, pal: bool = False) -> None:
@@ -22,22 +28,33 @@ class Rom(BigStream):
 
         self.pal: bool = pal
         self.original: Rom = self
-        self.changed_address: dict[int, int] = {}
+        self.changed_ranges: AddressRanges = AddressRanges()
         self.changed_dma: dict[int, tuple[int, int, int]] = {}
         self.force_patch: list[int] = []
         self.dma: DMAIterator = DMAIterator(self, DMADATA_START)
 
         if not pal:
-            with open(data_path('generated/symbols.json'), 'r') as stream:
-                symbols = json.load(stream)
-                self.symbols: dict[str, int] = {name: {'address': int(sym['address'], 16), 'length': sym['length']} for name, sym in symbols.items()}
+            self.symbols: dict[str, dict[str, int]] = load_symbols()
 
         if file is None:
             return
 
-        decompressed_file: str = local_path('ZOOTDEC-PAL.z64' if pal else 'ZOOTDEC.z64')
+        if pal:
+            self.read_decompressed_rom(file, pal=True)
+            return
+
+        # The original is shared with every other Rom of the same base ROM, and only ever read.
+        base_rom = read_base_rom(file)
+        self.buffer = bytearray(base_rom)
+        self.original = Rom()
+        self.original.buffer = base_rom
+
+        # Add version number to header.
+        self.write_version_bytes()
 
-        os.chdir(local_path())
+    # Reads the decompressed ROM, decompressing the given file first if there isn't one yet.
+    def read_decompressed_rom(self, file: str, *, pal: bool = False) -> None:
+        decompressed_file: str = local_path('ZOOTDEC-PAL.z64' if pal else 'ZOOTDEC.z64')
 
         if os.path.isfile(decompressed_file):
             # Try to read from previously decompressed rom if one exists.
@@ -53,18 +70,10 @@ class Rom(BigStream):
         else:
             raise FileNotFoundError('Must specify path to base ROM')
 
-        if not pal:
-            # Add file to maximum size
-            self.buffer.extend(bytearray([0x00] * (0x4000000 - len(self.buffer))))
-            self.original = self.copy()
-
-            # Add version number to header.
-            self.write_version_bytes()
-
     def copy(self) -> Rom:
         new_rom: Rom = Rom()
         new_rom.buffer = copy.copy(self.buffer)
-        new_rom.changed_address = copy.copy(self.changed_address)
+        new_rom.changed_ranges = self.changed_ranges.copy()
         new_rom.changed_dma = copy.copy(self.changed_dma)
         new_rom.force_patch = copy.copy(self.force_patch)
         return new_rom
@@ -112,7 +121,7 @@ class Rom(BigStream):
             pass
 
     def decompress_rom(self, input_file: str, output_file: str, verify_crc: bool = True, *, pal: bool = False) -> None:
-        sub_dir = "./" if is_bundled() else "bin/Decompress/"
+        sub_dir = local_path('' if is_bundled() else 'bin/Decompress/')
 
         if platform.system() == 'Windows':
             if platform.machine() == 'AMD64':
@@ -136,32 +145,37 @@ class Rom(BigStream):
         else:
             raise RuntimeError('Unsupported operating system for decompression. Please supply an already decompressed ROM.')
 
-        subprocess.check_call(subcall, **subprocess_args())
+        # Decompress to a file of this process first, so other processes never read a partly written output file.
+        output_root, output_extension = os.path.splitext(output_file)
+        temp_file = f'{output_root}-{os.getpid()}{output_extension}'
+        subcall[-1] = temp_file
+        try:
+            subprocess.check_call(subcall, **subprocess_args())
+            os.replace(temp_file, output_file)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
         self.read_rom(output_file, verify_crc=verify_crc, pal=pal)
 
     def write_byte(self, address: int, value: int) -> None:
         super().write_byte(address, value)
-        self.changed_address[self.last_address-1] = value
+        self.changed_ranges.add(self.last_address - 1, self.last_address)
 
+    # Writes the values, except for those that fall into a restrictive block.
     def write_bytes_restrictive(self, start: int, size: int, values: Sequence[int]) -> None:
-        for i in range(size):
-            address = start + i
-            should_write = True
-            for restrictiveBlock in restrictiveBytes:
-                # If i is between the start of restrictive zone [0] and start + size [1]
-                if restrictiveBlock[0] <= address < restrictiveBlock[0] + restrictiveBlock[1]:
-                    should_write = False
-                    break
-            if should_write:
-                self.write_byte(address, values[i])
-
-    def write_bytes(self, address: int, values: Sequence[int]) -> None:
+        writable = AddressRanges([(start, start + size)])
+        for restrictive_start, restrictive_size in restrictiveBytes:
+            writable.remove(restrictive_start, restrictive_start + restrictive_size)
+        for write_start, write_end in writable:
+            self.write_bytes(write_start, values[write_start - start:write_end - start])
+
+    def write_bytes(self, address: Optional[int], values: Sequence[int]) -> None:
         super().write_bytes(address, values)
-        self.changed_address.update(zip(range(address, address + len(values)), values))
+        self.changed_ranges.add(self.last_address - len(values), self.last_address)
 
     def restore(self) -> None:
-        self.buffer = copy.copy(self.original.buffer)
-        self.changed_address = {}
+        self.buffer = bytearray(self.original.buffer)
+        self.changed_ranges = AddressRanges()
         self.changed_dma = {}
         self.force_patch = []
         self.last_address = 0
@@ -203,9 +217,7 @@ class Rom(BigStream):
         overlapping_records = []
         dma_data = []
 
-        for dma_entry in self.dma:
-            this_start, this_end, this_size = dma_entry.as_tuple()
-
+        for this_start, this_end, this_size in self.dma.records():
             if this_start == 0 and this_end == 0:
                 break
 
@@ -241,35 +253,143 @@ class Rom(BigStream):
     # By default, this assumes any changes here are new files, so this should only be called
     # after patching in the new files, but before vanilla files are repointed
     def scan_dmadata_update(self, preserve_from_file: bool = False, assume_move: bool = False) -> None:
-        for dma_entry in self.dma:
-            dma_start, dma_end, dma_size = dma_entry.as_tuple()
-            old_dma_start, old_dma_end, old_dma_size = self.original.dma[dma_entry.index].as_tuple()
+        old_records = self.original.dma.records()
+        for index, (dma_start, dma_end, dma_size) in enumerate(self.dma.records()):
+            old_dma_start, old_dma_end, old_dma_size = old_records[index]
             if (dma_start == 0 and dma_end == 0) and (old_dma_start == 0 and old_dma_end == 0):
                 break
 
             # If the entries do not match, the flag the changed entry
             if not (dma_start == old_dma_start and dma_end == old_dma_end):
                 from_file = -1
-                if preserve_from_file and dma_entry.index in self.changed_dma:
-                    from_file = self.changed_dma[dma_entry.index][0]
-                elif assume_move and dma_entry.index < 1496:
+                if preserve_from_file and index in self.changed_dma:
+                    from_file = self.changed_dma[index][0]
+                elif assume_move and index < 1496:
                     from_file = old_dma_start
-                self.changed_dma[dma_entry.index] = (from_file, dma_start, dma_end - dma_start)
+                self.changed_dma[index] = (from_file, dma_start, dma_end - dma_start)
 
-    # This will rescan the entire ROM, compare to original ROM, and repopulate changed_address.
+    # This will rescan the entire ROM, compare to original ROM, and repopulate changed_ranges.
     def rescan_changed_bytes(self) -> None:
-        self.changed_address = {}
         size = len(self.buffer)
         original_size = len(self.original.buffer)
-        for i, byte in enumerate(self.buffer):
-            if i >= original_size:
-                self.changed_address[i] = byte
+        common_size = min(size, original_size)
+        self.changed_ranges = AddressRanges(find_changed_ranges(self.buffer, self.original.buffer, 0, common_size))
+        self.changed_ranges.add(common_size, max(size, original_size))
+
+
+@lru_cache(maxsize=None)
+def load_symbols() -> dict[str, dict[str, int]]:
+    with open(data_path('generated/symbols.json'), 'r') as stream:
+        symbols = json.load(stream)
+    return {name: {'address': int(sym['address'], 16), 'length': sym['length']} for name, sym in symbols.items()}
+
+
+# The decompressed base ROM, padded to the maximum size, by the path, size and modification time
+# of the decompressed file it was read from. It is immutable, so every Rom in the process shares
+# it as its original, and so do worker processes forked after it was read.
+base_roms: dict[tuple[str, int, int], bytes] = {}
+
+
+def decompressed_file_key(decompressed_file: str) -> Optional[tuple[str, int, int]]:
+    try:
+        stat = os.stat(decompressed_file)
+    except FileNotFoundError:
+        return None
+    return decompressed_file, stat.st_size, stat.st_mtime_ns
+
+
+def read_base_rom(file: str) -> bytes:
+    decompressed_file = local_path('ZOOTDEC.z64')
+    key = decompressed_file_key(decompressed_file)
+    if key in base_roms:
+        return base_roms[key]
+    rom = Rom()
+    rom.read_decompressed_rom(file)
+    # Add file to maximum size
+    rom.buffer.extend(bytearray([0x00] * (0x4000000 - len(rom.buffer))))
+    base_rom = bytes(rom.buffer)
+    base_roms.clear()
+    # An already decompressed ROM is read directly, without writing the decompressed file.
+    key = decompressed_file_key(decompressed_file)
+    if key is not None:
+        base_roms[key] = base_rom
+    return base_rom
+
+
+# A set of addresses, stored as sorted, merged ranges of [start, end). Added ranges are only
+# merged in once the set is read or enough of them piled up, so adding a range is cheap.
+class AddressRanges:
+    def __init__(self, ranges: Iterable[tuple[int, int]] = ()) -> None:
+        self._ranges: list[tuple[int, int]] = []
+        self._added: list[tuple[int, int]] = [(start, end) for start, end in ranges if start < end]
+        self._merge_at: int = 1024
+
+    def add(self, start: int, end: int) -> None:
+        if start < end:
+            self._added.append((start, end))
+            if len(self._added) >= self._merge_at:
+                self._merge()
+
+    def remove(self, start: int, end: int) -> None:
+        ranges = []
+        for range_start, range_end in self:
+            if range_end <= start or range_start >= end:
+                ranges.append((range_start, range_end))
                 continue
-            orig_byte = self.original.read_byte(i)
-            if byte != orig_byte:
-                self.changed_address[i] = byte
-        if size < original_size:
-            self.changed_address.update(zip(range(size, original_size-1), [0]*(original_size-size)))
+            if range_start < start:
+                ranges.append((range_start, start))
+            if range_end > end:
+                ranges.append((end, range_end))
+        self._ranges = ranges
+
+    def copy(self) -> AddressRanges:
+        new_ranges = AddressRanges()
+        new_ranges._ranges = list(self)
+        return new_ranges
+
+    def _merge(self) -> None:
+        if not self._added:
+            return
+        merged: list[tuple[int, int]] = []
+        for start, end in sorted(self._ranges + self._added):
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        self._ranges = merged
+        self._added = []
+        self._merge_at = max(1024, len(merged))
+
+    def __contains__(self, address: int) -> bool:
+        self._merge()
+        i = bisect_right(self._ranges, (address, float('inf'))) - 1
+        return i >= 0 and address < self._ranges[i][1]
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        self._merge()
+        return iter(self._ranges)
+
+    def __len__(self) -> int:
+        return sum(end - start for start, end in self)
+
+
+# Finds the ranges of addresses between start and end where the two buffers differ.
+def find_changed_ranges(buffer: bytearray, other_buffer: bytearray, start: int, end: int, chunk_size: int = 0x100000) -> Iterator[tuple[int, int]]:
+    for chunk_start in range(start, end, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, end)
+        chunk = buffer[chunk_start:chunk_end]
+        other_chunk = other_buffer[chunk_start:chunk_end]
+        if chunk == other_chunk:
+            continue
+        # The XOR of the chunks is zero exactly where they are the same.
+        difference = (int.from_bytes(chunk, 'big') ^ int.from_bytes(other_chunk, 'big')).to_bytes(chunk_end - chunk_start, 'big')
+        for match in changed_bytes.finditer(difference):
+            yield chunk_start + match.start(), chunk_start + match.end()
+
+
+# The start, end, physical start and physical end of a file.
+DMA_ENTRY: struct.Struct = struct.Struct('>IIII')
 
 
 class DMAEntry:
@@ -351,20 +471,22 @@ class DMAIterator:
         for item in range(0, self.dma_entries):
             yield self[item]
 
+    # Reads the (start, end, size) of every entry at once.
+    def records(self) -> list[tuple[int, int, int]]:
+        return [(start, end, end - start) for start, end, _, _ in self.rom.read_structs(self.dma_start, DMA_ENTRY, self.dma_entries)]
+
     # Gets a dmadata entry by the file start position.
     def get_dmadata_record_by_key(self, key: Optional[int]) -> DMAEntry:
-        for dma_entry in self:
-            if key is None and dma_entry.end == 0 and dma_entry.start == 0:
-                return dma_entry
-            elif dma_entry.start == key:
-                return dma_entry
+        for index, (start, end, _) in enumerate(self.records()):
+            if key is None and end == 0 and start == 0:
+                return self[index]
+            elif start == key:
+                return self[index]
         raise Exception(f"`get_dmadata_record_by_key`: DMA Start '{key}' not found in the DMA Table.")
 
     # Gets the last used byte of rom defined in the DMA table
     def end_of_data(self) -> int:
-        max_end = 0
-        for dma_entry in self:
-            max_end = max(max_end, dma_entry.end)
+        max_end = max((end for _, end, _ in self.records()), default=0)
 
         max_end = ((max_end + 0x0F) >> 4) << 4
         return max_end
@@ -374,7 +496,7 @@ class DMAIterator:
         free_space = []  # List of tuples containing size of free space and start of free space.
 
         # Get DMA entries in tuple form and then sort them.
-        files = sorted([dma_entry.as_tuple() for dma_entry in self])
+        files = sorted(self.records())
 
         # Find free space between files.
         for i in range(len(files)):
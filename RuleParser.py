@@ -3,6 +3,7 @@ import ast
 import logging
 import re
 from collections import defaultdict
+from collections.abc import Callable, Iterable
 from typing import TYPE_CHECKING, Optional, Any
 
 from Entrance import Entrance
@@ -37,6 +38,26 @@ allowed_globals.update(special_globals)
 rule_aliases: dict[str, tuple[list[re.Pattern[str]], str]] = {}
 nonaliases: set[str] = set()
 
+# Compiled rules by the dump of their transformed ast, shared by the parsers of every world
+# and generation attempt. A transformed rule only reads the state and its keyword args,
+# so the same code serves every world it comes up in.
+compiled_rules: dict[str, AccessRule] = {}
+
+# State functions that only read a fixed set of solver ids, regardless of their arguments.
+# Rules calling any other State function are treated as depending on the entire state.
+state_function_dependencies: dict[str, Callable[[], Iterable[int]]] = {
+    'has_bottle': lambda: (*ItemInfo.bottle_ids, ItemInfo.solver_ids['Rutos_Letter']),
+    'has_hearts': lambda: (ItemInfo.solver_ids['Piece_of_Heart'],),
+    'has_medallions': lambda: ItemInfo.medallion_ids,
+    'has_stones': lambda: ItemInfo.stone_ids,
+    'has_dungeon_rewards': lambda: (*ItemInfo.medallion_ids, *ItemInfo.stone_ids),
+    'has_ocarina_buttons': lambda: ItemInfo.ocarina_buttons_ids,
+    'has_all_notes_for_song': lambda: ItemInfo.ocarina_buttons_ids,
+    'region_has_shortcuts': lambda: (),
+    'had_night_start': lambda: (),
+    'can_live_dmg': lambda: (),
+}
+
 
 def load_aliases() -> None:
     j = read_logic_file(data_path('LogicHelpers.json'))
@@ -56,6 +77,72 @@ def isliteral(expr: ast.expr) -> bool:
     return isinstance(expr, ast.Constant)
 
 
+# Returns the same node as parsing repr(value), without going through the parser for simple constants.
+def literal_node(value: Any) -> ast.expr:
+    if value is None or isinstance(value, (bool, str)) or (isinstance(value, int) and value >= 0):
+        return ast.Constant(value)
+    return ast.parse('%r' % value, mode='eval').body
+
+
+class Rule_Dependency_Visitor(ast.NodeVisitor):
+    """Collects the solver ids a compiled rule body reads from its state.
+
+    If the rule reads anything else from the state that can change during a search
+    (such as region reachability through state.search), the rule is opaque and
+    dependencies is set to None."""
+
+    def __init__(self) -> None:
+        self.dependencies: Optional[set[int]] = set()
+
+    def add_name(self, node: ast.expr) -> None:
+        if self.dependencies is None:
+            return
+        if isinstance(node, ast.Name) and node.id in ItemInfo.solver_ids:
+            self.dependencies.add(ItemInfo.solver_ids[node.id])
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str) and escape_name(node.value) in ItemInfo.solver_ids:
+            self.dependencies.add(ItemInfo.solver_ids[escape_name(node.value)])
+        else:
+            self.dependencies = None
+
+    def visit_Call(self, node: ast.Call) -> None:
+        func = node.func
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == 'state':
+            if func.attr in ('has', 'item_count', 'item_name_count') and node.args:
+                self.add_name(node.args[0])
+            elif func.attr in ('has_any_of', 'has_all_of') and node.args and isinstance(node.args[0], ast.Tuple):
+                for elt in node.args[0].elts:
+                    self.add_name(elt)
+            elif func.attr in state_function_dependencies:
+                if self.dependencies is not None:
+                    self.dependencies.update(state_function_dependencies[func.attr]())
+            else:
+                self.dependencies = None
+            for child in node.args:
+                self.visit(child)
+            for keyword in node.keywords:
+                self.visit(keyword)
+            return
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        # state.world is constant for the lifetime of the state, everything else is not
+        if isinstance(node.value, ast.Name) and node.value.id == 'state':
+            if node.attr != 'world':
+                self.dependencies = None
+            return
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if node.id == 'state':
+            self.dependencies = None
+
+
+def rule_dependencies(body: ast.AST) -> Optional[frozenset[int]]:
+    visitor = Rule_Dependency_Visitor()
+    visitor.visit(body)
+    return None if visitor.dependencies is None else frozenset(visitor.dependencies)
+
+
 class Rule_AST_Transformer(ast.NodeTransformer):
     def __init__(self, world: World) -> None:
         self.world: World = world
@@ -70,9 +157,11 @@ class Rule_AST_Transformer(ast.NodeTransformer):
             load_aliases()
         # final rule cache
         self.rule_cache: dict[str, AccessRule] = {}
+        # names handled by this class, looked up for every name in every rule
+        self.attribute_names: frozenset[str] = frozenset(dir(self)) | {'attribute_names'}
 
     def visit_Name(self, node: ast.Name) -> Any:
-        if node.id in dir(self):
+        if node.id in self.attribute_names:
             return getattr(self, node.id)(node)
         elif node.id in rule_aliases:
             args, repl = rule_aliases[node.id]
@@ -89,10 +178,10 @@ class Rule_AST_Transformer(ast.NodeTransformer):
                 args=[node],
                 keywords=[])
         elif node.id in self.world.__dict__:
-            return ast.parse('%r' % self.world.__dict__[node.id], mode='eval').body
+            return literal_node(self.world.__dict__[node.id])
         elif node.id in self.world.settings.settings_dict:
             # Settings are constant
-            return ast.parse('%r' % self.world.settings.settings_dict[node.id], mode='eval').body
+            return literal_node(self.world.settings.settings_dict[node.id])
         elif node.id in State.__dict__:
             return self.make_call(node, node.id, [], [])
         elif node.id in kwarg_defaults or node.id in special_globals:
@@ -147,7 +236,7 @@ class Rule_AST_Transformer(ast.NodeTransformer):
 
         if isinstance(count, ast.Name):
             # Must be a settings constant
-            count = ast.parse('%r' % self.world.settings.settings_dict[count.id], mode='eval').body
+            count = literal_node(self.world.settings.settings_dict[count.id])
 
         if item.id not in ItemInfo.solver_ids:
             self.events.add(item.id.replace('_', ' '))
@@ -164,7 +253,7 @@ class Rule_AST_Transformer(ast.NodeTransformer):
         if not isinstance(node.func, ast.Name):
             return node
 
-        if node.func.id in dir(self):
+        if node.func.id in self.attribute_names:
             return getattr(self, node.func.id)(node)
         elif node.func.id in rule_aliases:
             args, repl = rule_aliases[node.func.id]
@@ -262,7 +351,7 @@ class Rule_AST_Transformer(ast.NodeTransformer):
                 res = eval(compile(ast.fix_missing_locations(ast.Expression(node)), '<string>', 'eval'))
             except TypeError as e:
                 raise Exception('Parse Error: %s' % e, self.current_spot.name, ast.dump(node, False))
-            return self.visit(ast.parse('%r' % res, mode='eval').body)
+            return self.visit(literal_node(res))
         return node
 
     def visit_UnaryOp(self, node: ast.UnaryOp) -> Any:
@@ -271,7 +360,7 @@ class Rule_AST_Transformer(ast.NodeTransformer):
         # if all the children are literals now, we can evaluate
         if isliteral(node.operand):
             res = eval(compile(ast.fix_missing_locations(ast.Expression(node)), '<string>', 'eval'))
-            return ast.parse('%r' % res, mode='eval').body
+            return literal_node(res)
         return node
 
     def visit_BinOp(self, node: ast.BinOp) -> Any:
@@ -280,7 +369,7 @@ class Rule_AST_Transformer(ast.NodeTransformer):
         # if all the children are literals now, we can evaluate
         if isliteral(node.left) and isliteral(node.right):
             res = eval(compile(ast.fix_missing_locations(ast.Expression(node)), '<string>', 'eval'))
-            return ast.parse('%r' % res, mode='eval').body
+            return literal_node(res)
         return node
 
     def visit_BoolOp(self, node: ast.BoolOp) -> Any:
@@ -297,7 +386,7 @@ class Rule_AST_Transformer(ast.NodeTransformer):
             elif (isinstance(elt, ast.Name) and elt.id not in rule_aliases
                     and elt.id not in self.world.__dict__
                     and elt.id not in self.world.settings.settings_dict
-                    and elt.id not in dir(self)
+                    and elt.id not in self.attribute_names
                     and elt.id not in State.__dict__):
                 items.add(elt.id)
             else:
@@ -406,13 +495,15 @@ class Rule_AST_Transformer(ast.NodeTransformer):
 
     def make_access_rule(self, body: ast.AST, filename: str = 'make_access_rule') -> AccessRule:
         rule_str = ast.dump(body, False)
-        if rule_str not in self.rule_cache:
+        if rule_str in self.rule_cache:
+            return self.rule_cache[rule_str]
+        if rule_str not in compiled_rules:
             # requires consistent iteration on dicts
             kwargs = [ast.arg(arg=k) for k in kwarg_defaults.keys()]
             kwd = list(map(ast.Constant, kwarg_defaults.values()))
             name = f'<{self.current_spot.name if self.current_spot else filename}: {rule_str}>'
             try:
-                self.rule_cache[rule_str] = eval(compile(
+                compiled_rules[rule_str] = eval(compile(
                     ast.fix_missing_locations(
                         ast.Expression(ast.Lambda(
                             args=ast.arguments(
@@ -428,6 +519,9 @@ class Rule_AST_Transformer(ast.NodeTransformer):
                     allowed_globals)
             except TypeError as e:
                 raise Exception('Parse Error: %s' % e, self.current_spot.name, ast.dump(body, False))
+            # Used by Search to skip re-evaluating failed rules when none of these items changed.
+            compiled_rules[rule_str].solver_ids = rule_dependencies(body)
+        self.rule_cache[rule_str] = compiled_rules[rule_str]
         return self.rule_cache[rule_str]
 
     ## Handlers for specific internal functions used in the json logic.
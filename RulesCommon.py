@@ -1,16 +1,62 @@
 from __future__ import annotations
 import re
-from typing import TYPE_CHECKING, Protocol, Any
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Protocol, Optional, Any
 
 if TYPE_CHECKING:
+    from Entrance import Entrance
+    from Location import Location
     from State import State
 
 
 class AccessRule(Protocol):
+    # Solver ids read by the rule, or None if it may read anything from the state.
+    # Only set for rules compiled by the RuleParser (or combined from them).
+    solver_ids: Optional[frozenset[int]]
+
     def __call__(self, state: State, **kwargs) -> bool:
         ...
 
 
+def combine_rules(rules: Sequence[AccessRule]) -> AccessRule:
+    def access_rule(state: State, **kwargs) -> bool:
+        for rule in rules:
+            if not rule(state, **kwargs):
+                return False
+        return True
+
+    solver_ids = frozenset()
+    for rule in rules:
+        rule_ids = getattr(rule, 'solver_ids', None)
+        if rule_ids is None:
+            solver_ids = None
+            break
+        solver_ids |= rule_ids
+    access_rule.solver_ids = solver_ids
+    return access_rule
+
+
+# Maps solver ids to the locations and exits whose access rule reads that item,
+# so that a search only has to re-check the spots affected by a collect or remove.
+# Spots whose access rule may read anything are kept in the opaque lists instead.
+class RuleIndex:
+    def __init__(self, locations: list[Location], exits: list[Entrance]) -> None:
+        self.location_dependents: dict[int, frozenset[Location]] = {}
+        self.exit_dependents: dict[int, list[Entrance]] = {}
+        self.opaque_locations: frozenset[Location] = frozenset(
+            location for location in locations if getattr(location.access_rule, 'solver_ids', None) is None)
+        self.opaque_exits: list[Entrance] = [exit for exit in exits if getattr(exit.access_rule, 'solver_ids', None) is None]
+        location_dependents: dict[int, list[Location]] = {}
+        for location in locations:
+            for solver_id in getattr(location.access_rule, 'solver_ids', None) or ():
+                location_dependents.setdefault(solver_id, []).append(location)
+        for solver_id, dependents in location_dependents.items():
+            self.location_dependents[solver_id] = frozenset(dependents)
+        for exit in exits:
+            for solver_id in getattr(exit.access_rule, 'solver_ids', None) or ():
+                self.exit_dependents.setdefault(solver_id, []).append(exit)
+
+
 # Variable names and values used by rule execution,
 # will be automatically filled by Items
 allowed_globals: dict[str, Any] = {}
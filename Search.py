@@ -1,11 +1,12 @@
 from __future__ import annotations
-import copy
 import itertools
 import sys
 from collections.abc import Callable, Iterable
+from bisect import insort
 from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Optional
 
+from Instrumentation import instrumentation
 from Region import Region, TimeOfDay
 from State import State
 
@@ -16,6 +17,7 @@ else:
 
 if TYPE_CHECKING:
     from Entrance import Entrance
+    from RulesCommon import RuleIndex
     from Item import Item
     from Location import Location
     from Goals import GoalCategory
@@ -25,17 +27,23 @@ ValidGoals: TypeAlias = "dict[str, bool | dict[str, list[int] | dict[int, list[s
 
 @dataclass
 class SearchCache:
-    child_queue: list[Entrance] = field(default_factory=list)
-    adult_queue: list[Entrance] = field(default_factory=list)
+    child_queue: dict[Entrance, None] = field(default_factory=dict)
+    adult_queue: dict[Entrance, None] = field(default_factory=dict)
     visited_locations: set[Location] = field(default_factory=set)
     child_regions: dict[Region, int] = field(default_factory=dict)
     adult_regions: dict[Region, int] = field(default_factory=dict)
+    log_positions: Optional[list[int]] = None
 
     def copy(self) -> SearchCache:
-        new = type(self)()
-        for name, value in self.__dict__.items():
-            setattr(new, name, copy.copy(value))
-        return new
+        # Copied field by field: this runs once per item placed during fill.
+        return SearchCache(
+            child_queue=self.child_queue.copy(),
+            adult_queue=self.adult_queue.copy(),
+            visited_locations=self.visited_locations.copy(),
+            child_regions=self.child_regions.copy(),
+            adult_regions=self.adult_regions.copy(),
+            log_positions=None if self.log_positions is None else self.log_positions.copy(),
+        )
 
 
 class Search:
@@ -48,19 +56,24 @@ class Search:
 
         self._cache: SearchCache
         self.cached_spheres: list[SearchCache]
+        self._rule_indexes: list[RuleIndex] = [state.world.get_rule_index() for state in self.state_list]
         if initial_cache:
             self._cache = initial_cache
+            # The copied states start with empty change logs.
+            self._cache.log_positions = None
             self.cached_spheres = [self._cache]
         else:
             root_regions = [state.world.get_region('Root') for state in self.state_list]
-            # The cache is a dict with 5 values:
+            # The cache is a dict with 6 values:
             #  child_regions, adult_regions: maps of Region -> tod, all the regions in that sphere
             #    values are lazily-determined tod flags (see TimeOfDay).
-            #  child_queue, adult_queue: queue of Entrance, all the exits to try next sphere
+            #  child_queue, adult_queue: ordered sets of Entrance, all the exits to try next sphere
             #  visited_locations: set of Locations visited in or before that sphere.
+            #  log_positions: lengths of the states' change logs when the queues were last tried,
+            #    or None if every exit in the queues has to be tried again.
             self._cache = SearchCache(
-                child_queue=list(exit for region in root_regions for exit in region.exits),
-                adult_queue=list(exit for region in root_regions for exit in region.exits),
+                child_queue=dict.fromkeys(exit for region in root_regions for exit in region.exits),
+                adult_queue=dict.fromkeys(exit for region in root_regions for exit in region.exits),
                 visited_locations=set(),
                 child_regions={region: TimeOfDay.NONE for region in root_regions},
                 adult_regions={region: TimeOfDay.NONE for region in root_regions},
@@ -71,6 +84,7 @@ class Search:
     def copy(self) -> Search:
         # we only need to copy the top sphere since that's what we're starting with and we don't go back
         # copy always makes a nonreversible instance
+        instrumentation.count('search_copies')
         return Search(self.state_list, initial_cache=self._cache.copy())
 
     def collect_all(self, itempool: Iterable[Item]) -> None:
@@ -123,10 +137,38 @@ class Search:
     def reset(self) -> None:
         raise Exception('Unimplemented for Search. Perhaps you want RewindableSearch.')
 
-    # Internal to the iteration. Modifies the exit_queue, regions.
-    # Returns a queue of the exits whose access rule failed,
-    # as a cache for the exits to try on the next iteration.
-    def _expand_regions(self, exit_queue: list[Entrance], regions: dict[Region, int], age: Optional[str]) -> list[Entrance]:
+    # Refreshes the rule indexes of the worlds. If any access rule has changed since the exits
+    # in the queues failed, they can't be assumed to fail again, so they all have to be tried again.
+    def _update_rule_indexes(self) -> list[RuleIndex]:
+        rule_indexes = [state.world.get_rule_index() for state in self.state_list]
+        if any(new is not old for new, old in zip(rule_indexes, self._rule_indexes)):
+            self._rule_indexes = rule_indexes
+            for cache in self.cached_spheres:
+                cache.log_positions = None
+        return self._rule_indexes
+
+    # Returns the solver ids collected or removed since the given change log positions
+    # as (rule index, solver id) pairs, and advances the positions to the ends of the logs.
+    def _changed_items(self, log_positions: list[int]) -> list[tuple[RuleIndex, int]]:
+        changes = []
+        for world_id, state in enumerate(self.state_list):
+            if len(state.changes) > log_positions[world_id]:
+                rule_index = self._rule_indexes[world_id]
+                changes.extend((rule_index, solver_id) for solver_id in dict.fromkeys(state.changes[log_positions[world_id]:]))
+                log_positions[world_id] = len(state.changes)
+        return changes
+
+    # Internal to the iteration. Modifies the queue, regions.
+    # The queue holds the exits whose access rule failed, as a cache for the exits to
+    # try on the next iteration. If affected is given, only the exits in it are retried,
+    # the others are assumed to fail again. Newly reached regions are appended to reached.
+    def _expand_regions(self, queue: dict[Entrance, None], regions: dict[Region, int], age: Optional[str],
+                        affected: Optional[dict[Entrance, None]] = None, reached: Optional[list[Region]] = None) -> None:
+        if affected is None:
+            exit_queue = list(queue)
+            queue.clear()
+        else:
+            exit_queue = [exit for exit in affected if exit in queue]
         failed = []
         for exit in exit_queue:
             if exit.world and exit.connected_region and exit.connected_region not in regions:
@@ -140,10 +182,16 @@ class Search:
                         failed = []
                         regions[exit.world.get_region('Root')] |= exit.connected_region.provides_time
                     regions[exit.connected_region] = exit.connected_region.provides_time
+                    queue.pop(exit, None)
                     exit_queue.extend(exit.connected_region.exits)
+                    if reached is not None:
+                        reached.append(exit.connected_region)
                 else:
                     failed.append(exit)
-        return failed
+                    queue[exit] = None
+            else:
+                queue.pop(exit, None)
+        instrumentation.count('exit_checks', len(exit_queue))
 
     def _expand_tod_regions(self, regions: dict[Region, int], goal_region: Region, age: Optional[str], tod: int) -> bool:
         # grab all the exits from the regions with the given tod in the same world as our goal.
@@ -166,14 +214,27 @@ class Search:
     # the regions accessible as adult, and the set of visited locations.
     # These are references to the new entry in the cache, so they can be modified
     # directly.
-    def next_sphere(self) -> tuple[dict[Region, int], dict[Region, int], set[Location]]:
+    # If reached is given, the regions newly reached are appended to it.
+    def next_sphere(self, reached: Optional[list[Region]] = None) -> tuple[dict[Region, int], dict[Region, int], set[Location]]:
         # Use the queue to iteratively add regions to the accessed set,
         # until we are stuck or out of regions.
 
-        # Replace the queues (which have been modified) with just the
-        # failed exits that we can retry next time.
-        self._cache.adult_queue = self._expand_regions(self._cache.adult_queue, self._cache.adult_regions, 'adult')
-        self._cache.child_queue = self._expand_regions(self._cache.child_queue, self._cache.child_regions, 'child')
+        # Leave the queues with just the failed exits that we can retry next time.
+        # Exits whose access rule doesn't read any item changed since the last time
+        # would fail again, so only the others are retried.
+        affected = None
+        if self._cache.log_positions is None:
+            self._cache.log_positions = [len(state.changes) for state in self.state_list]
+        else:
+            affected = {}
+            for rule_index in self._rule_indexes:
+                affected.update(dict.fromkeys(rule_index.opaque_exits))
+            for rule_index, solver_id in self._changed_items(self._cache.log_positions):
+                exits = rule_index.exit_dependents.get(solver_id)
+                if exits:
+                    affected.update(dict.fromkeys(exits))
+        self._expand_regions(self._cache.adult_queue, self._cache.adult_regions, 'adult', affected, reached)
+        self._expand_regions(self._cache.child_queue, self._cache.child_regions, 'child', affected, reached)
 
         return self._cache.child_regions, self._cache.adult_regions, self._cache.visited_locations
 
@@ -185,52 +246,108 @@ class Search:
     # Inside the loop, the caller usually wants to collect items at these
     # locations to see if the game is beatable. Collection should be done
     # using internal State (recommended to just call search.collect).
+    #
+    # After the first pass, only the locations whose access rule may give a different
+    # result are checked again: those in newly reached regions, those whose access rule
+    # reads an item collected or removed since they were checked, and those whose access
+    # rule has unknown dependencies. They are checked in the order of item_locations.
     def iter_reachable_locations(self, item_locations: Iterable[Location]) -> Iterable[Location]:
+        return self._iter_reachable_locations(item_locations, in_order=True)
+
+    # If in_order is False, locations made reachable by a change the caller makes during a pass
+    # are only checked in the next pass, even if they come later in item_locations. This saves
+    # looking up the affected locations after every yield, but the locations may be yielded
+    # in a different order than by iter_reachable_locations.
+    def _iter_reachable_locations(self, item_locations: Iterable[Location], in_order: bool) -> Iterable[Location]:
+        rule_indexes = self._update_rule_indexes()
+        item_locations = list(item_locations)
+        # Maps each location to its first position in item_locations.
+        position = dict(zip(reversed(item_locations), range(len(item_locations) - 1, -1, -1)))
+        unvisited = set(position)
+        unvisited.difference_update(self._cache.visited_locations)
+        log_positions = [len(state.changes) for state in self.state_list]
+        reached: list[Region] = []
+        # Visited locations are filtered out in bulk rather than one by one in the loop below.
+        candidates = sorted(map(position.__getitem__, unvisited))
+        scheduled: Optional[set[Location]] = None
         had_reachable_locations = True
         # will loop as long as any visits were made, and at least once
         while had_reachable_locations:
-            child_regions, adult_regions, visited_locations = self.next_sphere()
+            child_regions, adult_regions, visited_locations = self.next_sphere(reached)
+            if scheduled is not None:
+                # Checking a location again doesn't change the result, so the locations affected
+                # by changes made during the previous pass are all checked again, even the ones
+                # that were already checked after the change.
+                for region in reached:
+                    scheduled.update(region.locations)
+                for rule_index, solver_id in self._changed_items(log_positions):
+                    scheduled.update(rule_index.location_dependents.get(solver_id, ()))
+                for rule_index in rule_indexes:
+                    scheduled.update(rule_index.opaque_locations)
+                scheduled.intersection_update(unvisited)
+                candidates = sorted(map(position.__getitem__, scheduled))
+            reached.clear()
+            yield_log_positions = list(log_positions)
 
             # Get all locations in accessible_regions that aren't visited,
             # and check if they can be reached. Collect them.
             had_reachable_locations = False
-            for loc in item_locations:
+            # Locations may be inserted after the current one while iterating.
+            for k, i in enumerate(candidates):
+                loc = item_locations[i]
                 if loc in visited_locations:
                     continue
                 # Check adult first; it's the most likely.
-                if (loc.parent_region in adult_regions
-                        and loc.access_rule(self.state_list[loc.world.id], spot=loc, age='adult')):
-                    had_reachable_locations = True
-                    # Mark it visited for this algorithm
-                    visited_locations.add(loc)
-                    yield loc
-
-                elif (loc.parent_region in child_regions
-                      and loc.access_rule(self.state_list[loc.world.id], spot=loc, age='child')):
+                if ((loc.parent_region in adult_regions
+                        and loc.access_rule(self.state_list[loc.world.id], spot=loc, age='adult'))
+                        or (loc.parent_region in child_regions
+                            and loc.access_rule(self.state_list[loc.world.id], spot=loc, age='child'))):
                     had_reachable_locations = True
                     # Mark it visited for this algorithm
                     visited_locations.add(loc)
+                    unvisited.discard(loc)
                     yield loc
+                    # Locations later in this pass that the caller's changes may have made
+                    # reachable have to be checked in this pass. The first pass checks every location.
+                    if in_order and scheduled is not None:
+                        for rule_index, solver_id in self._changed_items(yield_log_positions):
+                            dependents = rule_index.location_dependents.get(solver_id)
+                            if dependents:
+                                affected = dependents & unvisited
+                                affected -= scheduled
+                                scheduled |= affected
+                                for j in map(position.__getitem__, affected):
+                                    if j > i:
+                                        insort(candidates, j, k + 1)
+            instrumentation.count('location_checks', len(candidates))
+            scheduled = set()
 
     # This collects all item locations available in the state list given that
     # the states have collected items. The purpose is that it will search for
     # all new items that become accessible with a new item set.
     def collect_locations(self, item_locations: Optional[Iterable[Location]] = None) -> None:
-        item_locations = item_locations or self.progression_locations()
-        for location in self.iter_reachable_locations(item_locations):
+        item_locations = item_locations or self._unvisited_progression_locations()
+        for location in self._iter_reachable_locations(item_locations, in_order=False):
             # Collect the item for the state world it is for
             self.collect(location.item)
 
     # A shorthand way to iterate over locations without collecting items.
     def visit_locations(self, locations: Optional[Iterable[Location]] = None) -> None:
-        locations = locations or self.progression_locations()
-        for _ in self.iter_reachable_locations(locations):
+        locations = locations or self._unvisited_progression_locations()
+        for _ in self._iter_reachable_locations(locations, in_order=False):
             pass
 
     # Retrieve all item locations in the worlds that have progression items
     def progression_locations(self) -> list[Location]:
         return [location for state in self.state_list for location in state.world.get_locations() if location.item and location.item.advancement]
 
+    # Visited locations are skipped by the search anyway, and checking the cheap set membership
+    # first avoids looking up whether their items are advancement items.
+    def _unvisited_progression_locations(self) -> list[Location]:
+        visited_locations = self._cache.visited_locations
+        return [location for state in self.state_list for location in state.world.get_locations()
+                if location not in visited_locations and location.item and location.item.advancement]
+
     # This returns True if every state is beatable. It's important to ensure
     # all states beatable since items required in one world can be in another.
     # A state is beatable if it can ever collect the Triforce.
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import base64
+import copy
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import Main
+from Main import main, init_rom_worker, uses_rom
+from Rom import Rom, read_base_rom
+from Settings import Settings
+from version import __version__
+
+
+# Serves generation requests over HTTP from a pool of settings.generation_workers processes
+# that stay alive between requests, so a request doesn't pay for starting Python, importing
+# the randomizer, or loading the base ROM.
+#
+# GET /status returns the version and number of workers.
+# POST /generate takes a settings JSON object, in the same format as a --settings file, and
+# returns the seed, the parsed spoiler (or settings) log as "spoiler", and every other output
+# file, such as the patch file, base64 encoded in "files".
+class GenerationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], settings: Settings) -> None:
+        super().__init__(address, GenerationRequestHandler)
+        self.workers: int = max(settings.generation_workers, 1)
+        if uses_rom(settings):
+            # Workers forked from here share the base ROM read here.
+            read_base_rom(settings.rom)
+        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_rom_worker,
+                                                                 initargs=(settings.settings_dict, logging.getLogger('').getEffectiveLevel()))
+        # Start every worker now rather than on the first requests.
+        for future in [self.executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown()
+
+
+class GenerationRequestHandler(BaseHTTPRequestHandler):
+    server: GenerationServer
+
+    def do_GET(self) -> None:
+        if self.path != '/status':
+            self.send_json(404, {'error': f'Unknown path: {self.path}'})
+            return
+        self.send_json(200, {'version': __version__, 'workers': self.server.workers})
+
+    def do_POST(self) -> None:
+        if self.path != '/generate':
+            self.send_json(404, {'error': f'Unknown path: {self.path}'})
+            return
+        try:
+            settings_dict = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            if not isinstance(settings_dict, dict):
+                raise TypeError('Settings must be a JSON object.')
+            custom_seed = bool(settings_dict.get('seed'))
+            # Seeds are picked here, since forked workers share the state of the random generator.
+            settings = Settings(settings_dict, strict=True)
+        except Exception as ex:
+            self.send_json(400, {'error': f'{type(ex).__name__}: {ex}'})
+            return
+        try:
+            result = self.server.executor.submit(generate_server_seed, settings.settings_dict, custom_seed).result()
+        except Exception as ex:
+            result = {'error': f'{type(ex).__name__}: {ex}'}
+        self.send_json(500 if 'error' in result else 200, result)
+
+    def send_json(self, status: int, content: dict[str, Any]) -> None:
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logging.getLogger('').info('%s - %s', self.address_string(), format % args)
+
+
+# Runs in a worker process. Errors are returned as text, like those of batch seeds.
+def generate_server_seed(settings_dict: dict[str, Any], custom_seed: bool) -> dict[str, Any]:
+    settings = Settings(copy.deepcopy(settings_dict))
+    settings.custom_seed = custom_seed
+    # Every worker is already busy with a request of its own.
+    settings.parallel_attempts = 1
+    try:
+        if uses_rom(settings) and Main.worker_rom is None:
+            Main.worker_rom = Rom(settings.rom)
+        with tempfile.TemporaryDirectory() as output_dir:
+            settings.output_dir = output_dir
+            settings.output_file = ''
+            main(settings, rom=Main.worker_rom)
+            result = {'seed': settings.seed, 'settings_string': settings.settings_string, 'spoiler': None, 'files': {}}
+            for filename in sorted(os.listdir(output_dir)):
+                path = os.path.join(output_dir, filename)
+                if filename.endswith(('_Spoiler.json', '_Settings.json')):
+                    with open(path, encoding='utf-8') as f:
+                        result['spoiler'] = json.load(f)
+                else:
+                    with open(path, 'rb') as f:
+                        result['files'][filename] = base64.b64encode(f.read()).decode('ascii')
+    except Exception as ex:
+        logging.getLogger('').exception(ex)
+        return {'error': f'{type(ex).__name__}: {ex}'}
+    return result
+
+
+def serve(settings: Settings, port: int, host: str = '127.0.0.1') -> None:
+    logger = logging.getLogger('')
+    with GenerationServer((host, port), settings) as server:
+        logger.info('Serving generation requests on http://%s:%d with %d workers.', *server.server_address[:2], server.workers)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -393,7 +393,7 @@ class Settings(SettingInfos):
 
 
 # gets the randomizer settings, whether to open the gui, and the logger level from command line arguments
-def get_settings_from_command_line_args() -> tuple[Settings, bool, str, bool, str]:
+def get_settings_from_command_line_args() -> tuple[Settings, bool, str, bool, str, Optional[int]]:
     parser = argparse.ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
 
     parser.add_argument('--gui', help='Launch the GUI', action='store_true')
@@ -405,7 +405,13 @@ def get_settings_from_command_line_args() -> tuple[Settings, bool, str, bool, st
     parser.add_argument('--seed', help='Generate the specified seed.')
     parser.add_argument('--no_log', help='Suppresses the generation of a log file.', action='store_true')
     parser.add_argument('--output_settings', help='Always outputs a settings.json file even when spoiler is enabled.', action='store_true')
+    parser.add_argument('--output_timing', help='Outputs a timing.json file with the time spent in each phase of generation.', action='store_true')
     parser.add_argument('--diff_rom', help='Generates a ZPF patch from the specified ROM file.')
+    parser.add_argument('--workers', type=int, help='Number of processes to generate the seeds of a batch (count > 1) in.')
+    parser.add_argument('--parallel_attempts', type=int, help='Number of generation attempts to run at once in separate processes.')
+    parser.add_argument('--fill_dungeon_items_per_dungeon', help='Place the items restricted to their own dungeons one dungeon at a time. Changes where they are placed.', action='store_true')
+    parser.add_argument('--dungeon_fill_workers', type=int, help='Number of processes to place the items restricted to their own dungeons in, when they are placed per dungeon.')
+    parser.add_argument('--server', type=int, metavar='PORT', help='Serve generation requests on the given local port, using --workers processes.')
 
     args = parser.parse_args()
     settings_base = {}
@@ -447,6 +453,7 @@ def get_settings_from_command_line_args() -> tuple[Settings, bool, str, bool, st
     settings = Settings(settings_base)
 
     settings.output_settings = args.output_settings
+    settings.output_timing = args.output_timing
 
     if args.settings_string is not None:
         settings.update_with_settings_string(args.settings_string)
@@ -455,6 +462,18 @@ def get_settings_from_command_line_args() -> tuple[Settings, bool, str, bool, st
         settings.update_seed(args.seed)
         settings.custom_seed = True
 
+    if args.workers is not None:
+        settings.generation_workers = args.workers
+
+    if args.parallel_attempts is not None:
+        settings.parallel_attempts = args.parallel_attempts
+
+    if args.fill_dungeon_items_per_dungeon:
+        settings.fill_dungeon_items_per_dungeon = True
+
+    if args.dungeon_fill_workers is not None:
+        settings.dungeon_fill_workers = args.dungeon_fill_workers
+
     if args.convert_settings:
         if args.settings_string is not None:
             # used by the GUI which doesn't support the new dict-style starting items yet
@@ -463,4 +482,4 @@ def get_settings_from_command_line_args() -> tuple[Settings, bool, str, bool, st
             print(settings.get_settings_string())
         sys.exit(0)
 
-    return settings, args.gui, args.loglevel, args.no_log, args.diff_rom
+    return settings, args.gui, args.loglevel, args.no_log, args.diff_rom, args.server
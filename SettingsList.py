@@ -12,7 +12,7 @@ from Location import LocationIterator
 from LocationList import location_table
 from Models import get_model_choices
 from SettingsListTricks import logic_tricks
-from SettingTypes import SettingInfo, SettingInfoStr, SettingInfoList, SettingInfoDict, Textbox, Button, Checkbutton, \
+from SettingTypes import SettingInfo, SettingInfoStr, SettingInfoInt, SettingInfoList, SettingInfoDict, Textbox, Button, Checkbutton, \
     Combobox, Radiobutton, Fileinput, Directoryinput, Textinput, ComboboxInt, Scale, Numberinput, MultipleSelect, \
     SearchBox
 import Sounds
@@ -43,10 +43,17 @@ class SettingInfos:
     check_version = Checkbutton(None)
     checked_version = SettingInfoStr(None, None)
     output_settings = Checkbutton(None)
+    output_timing = Checkbutton(None)
     patch_without_output = Checkbutton(None)
     generating_patch_file = Checkbutton(None)
     output_file = SettingInfoStr(None, None)
     seed = SettingInfoStr(None, None)
+    generation_workers = SettingInfoInt(None, None, False, default=1)
+    parallel_attempts = SettingInfoInt(None, None, False, default=1)
+    fill_backtrack_depth = SettingInfoInt(None, None, False, default=0)
+    fill_backtrack_seconds = SettingInfoInt(None, None, False, default=0)
+    fill_dungeon_items_per_dungeon = Checkbutton(None)
+    dungeon_fill_workers = SettingInfoInt(None, None, False, default=1)
 
     # GUI Only Buttons/Text
 
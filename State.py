@@ -25,14 +25,17 @@ Ocarina_C_right_Button: int = ItemInfo.solver_ids['Ocarina_C_right_Button']
 class State:
     def __init__(self, parent: World) -> None:
         self.solv_items: list[int] = [0] * len(ItemInfo.solver_ids)
+        # Solver ids changed by collect/remove, in order. Lets a search re-check only the
+        # access rules that read an item changed since they were last checked.
+        self.changes: list[int] = []
         self.world: World = parent
         self.search: Optional[Search] = None
 
     def copy(self, new_world: Optional[World] = None) -> State:
         new_world = new_world if new_world else self.world
         new_state = State(new_world)
-        for i, val in enumerate(self.solv_items):
-            new_state.solv_items[i] = val
+        # States created before new events were registered have fewer solver ids.
+        new_state.solv_items[:len(self.solv_items)] = self.solv_items
         return new_state
 
     def item_name(self, location: str | Location) -> Optional[str]:
@@ -151,11 +154,14 @@ class State:
         if 'Small Key Ring' in item.name:
             dungeon_name = item.name[:-1].split(' (', 1)[1]
             if self.world.keyring_give_bk(dungeon_name):
-                bk = f'Boss Key ({dungeon_name})'
-                self.solv_items[ItemInfo.solver_ids[escape_name(bk)]] = 1
+                bk_id = ItemInfo.solver_ids[escape_name(f'Boss Key ({dungeon_name})')]
+                self.solv_items[bk_id] = 1
+                self.changes.append(bk_id)
         if item.alias and item.alias_id is not None:
             self.solv_items[item.alias_id] += item.alias[1]
+            self.changes.append(item.alias_id)
         self.solv_items[item.solver_id] += 1
+        self.changes.append(item.solver_id)
 
     # Be careful using this function. It will not uncollect any
     # items that may be locked behind the item, only the item itself.
@@ -165,14 +171,17 @@ class State:
         if 'Small Key Ring' in item.name:
             dungeon_name = item.name[:-1].split(' (', 1)[1]
             if self.world.keyring_give_bk(dungeon_name):
-                bk = f'Boss Key ({dungeon_name})'
-                self.solv_items[ItemInfo.solver_ids[escape_name(bk)]] = 0
+                bk_id = ItemInfo.solver_ids[escape_name(f'Boss Key ({dungeon_name})')]
+                self.solv_items[bk_id] = 0
+                self.changes.append(bk_id)
         if item.alias and item.alias_id is not None and self.solv_items[item.alias_id] > 0:
             self.solv_items[item.alias_id] -= item.alias[1]
             if self.solv_items[item.alias_id] < 0:
                 self.solv_items[item.alias_id] = 0
+            self.changes.append(item.alias_id)
         if self.solv_items[item.solver_id] > 0:
             self.solv_items[item.solver_id] -= 1
+            self.changes.append(item.solver_id)
 
     def region_has_shortcuts(self, region_name: str) -> bool:
         return self.world.region_has_shortcuts(region_name)
@@ -3,28 +3,44 @@
 # See `python -m unittest -h` or `pytest -h` for more options.
 
 from __future__ import annotations
+import gzip
 import io
 import json
 import logging
 import os
 import random
 import re
+import struct
+import tempfile
+import threading
 import unittest
+import urllib.error
+import urllib.request
 from collections import Counter, defaultdict
 from typing import Literal, Optional, Any, overload
 
+from Benchmark import find_regressions
 from EntranceShuffle import EntranceShuffleError
-from Fill import ShuffleError
+from Fill import FillBacktracker, FillCandidates, FillSearch, ShuffleError
 from Hints import HintArea, build_misc_item_hints
+from Instrumentation import instrumentation
 from Item import ItemInfo
 from ItemPool import remove_junk_items, remove_junk_ludicrous_items, ludicrous_items_base, ludicrous_items_extended, trade_items, ludicrous_exclusions, triforce_blitz_items
 from LocationList import location_is_viewable
-from Main import main, resolve_settings, build_world_graphs
-from Messages import Message, read_messages, shuffle_messages
+from MBSDIFFPatch import apply_minibsdiff_patch_file
+from Main import main, main_batch, resolve_settings, build_world_graphs
+from Messages import Message, read_messages, repack_messages, shuffle_messages, EXTENDED_TABLE_START, JPN_TEXT_START, ENG_TEXT_START
+from N64Patch import create_patch_file, apply_patch_file, key_next, XorKeyStream
+from Patches import get_actor_index, get_actor_list
 from Settings import Settings, get_preset_files
 from Spoiler import Spoiler
-from Rom import Rom
+from Rom import Rom, AddressRanges
+from Search import Search
+from Server import GenerationServer
+from State import State
 from Audiobank import *
+from crc import calculate_crc
+from ntype import BigStream
 
 test_dir = os.path.join(os.path.dirname(__file__), 'tests')
 output_dir = os.path.join(test_dir, 'Output')
@@ -94,6 +110,11 @@ def load_spoiler(json_file: str) -> Any:
         return json.load(f)
 
 
+# random.Random.randbytes, which needs Python 3.9.
+def random_bytes(rng: random.Random, length: int) -> bytes:
+    return rng.getrandbits(8 * length).to_bytes(length, 'little')
+
+
 @overload
 def generate_with_plandomizer(filename: str, live_copy: Literal[False] = False, max_attempts: int = 10) -> tuple[dict[str, Any], dict[str, Any]]:
     pass
@@ -729,6 +750,431 @@ class TestEntranceRandomizer(unittest.TestCase):
                     self.assertEqual(savewarp.connected_region.name, savewarp.name.split(' -> ')[1])
 
 
+class TestSearch(unittest.TestCase):
+    def test_incremental_reachability(self):
+        # A search that keeps collecting items only re-checks the rules that read those items,
+        # so it has to agree with a fresh search over the same items at every step.
+        _, spoiler = generate_with_plandomizer("empty", live_copy=True)
+        locations = [location for world in spoiler.worlds for location in world.get_locations() if location.item and location.item.advancement]
+        items = [location.item for location in locations]
+        random.Random('TESTTESTTEST').shuffle(items)
+        search = Search([State(world) for world in spoiler.worlds])
+        for item in items:
+            search.collect(item)
+            search.visit_locations(locations)
+            fresh = Search(search.state_list)
+            fresh.visit_locations(locations)
+            self.assertEqual(search._cache.visited_locations, fresh._cache.visited_locations)
+            for age in ('child', 'adult'):
+                self.assertEqual(search.reachable_regions(age), fresh.reachable_regions(age))
+
+
+class TestFill(unittest.TestCase):
+    def test_fill_candidates(self):
+        # The answers shared by every item of the same name and world, and by every location of the same region,
+        # have to be the ones each item and location would get on its own.
+        settings = make_settings_for_test({'shuffle_smallkeys': 'regional', 'shuffle_bosskeys': 'any_dungeon', 'shuffle_mapcompass': 'overworld',
+                                           'shuffle_silver_rupees': 'regional', 'shuffle_song_items': 'dungeon', 'world_count': 2}, seed='TESTTESTTEST')
+        _, world_settings = resolve_settings(settings)
+        worlds = build_world_graphs(world_settings)
+        items = {(item.name, item.world.id): item for world in worlds for item in [*world.itempool, *world.get_restricted_dungeon_items()]}
+        locations = [location for world in worlds for location in world.get_unfilled_locations()]
+        candidates = FillCandidates()
+        for item in items.values():
+            for location in locations:
+                self.assertEqual(candidates.can_fill_fast(location, item), location.can_fill_fast(item), f'{item} [World {item.world.id + 1}] at {location}')
+        candidates.remove(locations[0])
+        self.assertTrue(all(locations[0] not in location_fills for location_fills in candidates.location_fills.values()))
+
+    def test_fill_candidates_source_spot(self):
+        # Items of another world have to be reachable at the location of the same name in their own world, or in
+        # a region leading to the location if there's no such location, like in dungeons that are MQ in only one world.
+        settings = make_settings_for_test({'world_count': 2, 'mq_dungeons_mode': 'random'}, seed='TESTTESTTEST')
+        _, world_settings = resolve_settings(settings)
+        worlds = build_world_graphs(world_settings)
+        candidates = FillCandidates()
+        regions = 0
+        for world, other_world in (worlds, worlds[::-1]):
+            other_names = {location.name for location in other_world.get_locations()}
+            other_regions = {region.name for region in other_world.regions}
+            for location in world.get_locations():
+                spot = candidates.source_spot(location, other_world)
+                if location.name in other_names:
+                    self.assertIs(spot, other_world.get_location(location.name))
+                elif spot is not None:
+                    entered_through = []
+                    region = location.parent_region
+                    while region.name != spot.name:
+                        entered_through.append(region.name)
+                        region = region.entrances[0].parent_region
+                    self.assertIs(spot, other_world.get_region(spot.name))
+                    self.assertTrue(other_regions.isdisjoint(entered_through))
+                    regions += 1
+        self.assertGreater(regions, 0)
+
+    def test_fill_search(self):
+        # Starting from a search made a few placements ago has to reach what a search from the items alone reaches.
+        settings = make_settings_for_test({}, seed='TESTTESTTEST')
+        _, world_settings = resolve_settings(settings)
+        world = build_world_graphs(world_settings)[0]
+        itempool = [item for item in world.itempool if item.advancement][:20]
+        locations = list(world.get_unfilled_locations())
+        items_search = Search([world.state])
+        items_search.collect_all(itempool)
+        fill_search = FillSearch(items_search)
+        while itempool:
+            item = itempool.pop()
+            items_search.uncollect(item)
+            max_search = fill_search.max_search(itempool)
+            expected_search = items_search.copy()
+            expected_search.collect_locations()
+            for age in ('child', 'adult'):
+                self.assertEqual(max_search.reachable_regions(age), expected_search.reachable_regions(age))
+            self.assertEqual(max_search.state_list[0].solv_items, expected_search.state_list[0].solv_items)
+            location = next(location for location in locations if location.can_fill(expected_search.state_list[0], item))
+            world.push_item(location, item)
+            locations.remove(location)
+
+    def test_fill_backtracker(self):
+        settings = make_settings_for_test({'fill_backtrack_depth': 2}, seed='TESTTESTTEST')
+        _, world_settings = resolve_settings(settings)
+        worlds = build_world_graphs(world_settings)
+        world = worlds[0]
+        locations = [location for location in world.get_unfilled_locations() if location.type == 'Chest'][:3]
+        items = world.itempool[:4]
+        items_search = Search([world.state])
+        backtracker = FillBacktracker(world.settings)
+        for location, item in zip(locations, items):
+            backtracker.place(location, item)
+            world.push_item(location, item)
+        remaining_locations = []
+        itempool = []
+        candidates = FillCandidates()
+        # The first time the last item can't be placed, the fill goes back to the last location it could be placed
+        # at, then to the one before it, placing the items that were taken back again in the same order after it.
+        for depth in (1, 2):
+            self.assertTrue(backtracker.backtrack(items[3], remaining_locations, itempool, items_search, candidates))
+            self.assertEqual(itempool[-depth - 1:], [*items[3 - depth:3][::-1], items[3]])
+            self.assertEqual(remaining_locations[-depth:], locations[3 - depth:][::-1])
+            for location, item in zip(locations[3 - depth:], items[3 - depth:3]):
+                self.assertIsNone(location.item)
+                self.assertIsNone(item.location)
+                self.assertTrue(backtracker.can_place(location, items[3]))
+            self.assertFalse(backtracker.can_place(locations[3 - depth], items[3 - depth]))
+            for location, item in zip(locations[3 - depth:], items[3 - depth:3]):
+                backtracker.place(location, item)
+                world.push_item(location, item)
+        self.assertFalse(backtracker.backtrack(items[3], remaining_locations, itempool, items_search, candidates))
+        self.assertEqual(locations[0].item, items[0])
+
+    def test_dungeon_groups(self):
+        # Placing the dungeons in forked processes has to place them like placing them one after another.
+        spoilers = []
+        for workers in (2, 1):
+            settings = make_settings_for_test({'world_count': 2, 'shuffle_mapcompass': 'dungeon', 'fill_dungeon_items_per_dungeon': True, 'dungeon_fill_workers': workers}, seed='TESTTESTTEST', outfilename='dungeon_groups')
+            main(settings, max_attempts=1)
+            self.assertGreater(instrumentation.counters['dungeon_fill_groups'], 1)
+            spoilers.append(load_spoiler(f'{settings.output_file}_Spoiler.json'))
+        self.assertEqual(spoilers[0]['locations'], spoilers[1]['locations'])
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_timing_log(self):
+        settings = make_settings_for_test({}, seed='TESTTIMING', outfilename='timing')
+        settings.output_timing = True
+        main(settings)
+        timing = load_spoiler(f'{settings.output_file}_Timing.json')
+        for phase in ('resolve_settings', 'build_world_graphs', 'set_entrances', 'distribute_items_restrictive', 'create_playthrough', 'build_gossip_hints'):
+            self.assertIn(phase, timing['phases'])
+            self.assertGreaterEqual(timing['phases'][phase]['calls'], 1)
+        self.assertGreaterEqual(timing['total']['wall'], timing['phases']['build_world_graphs']['wall'])
+        self.assertGreater(timing['counters']['location_checks'], 0)
+        self.assertGreater(timing['counters']['search_copies'], 0)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_find_regressions(self):
+        baseline = {'micro/a': {'total': 1.0}, 'generate/b': {'total': 2.0, 'build_world_graphs': 1.0, 'resolve_settings': 0.001}}
+        results = {'micro/a': {'total': 1.1}, 'generate/b': {'total': 3.0, 'build_world_graphs': 0.9, 'resolve_settings': 0.01}, 'micro/c': {'total': 5.0}}
+        self.assertEqual(find_regressions(results, baseline, 1.2), {'generate/b total': (2.0, 3.0)})
+
+
+class TestCRC(unittest.TestCase):
+    # The word by word algorithm calculate_crc computes in bulk.
+    @staticmethod
+    def reference_crc(data: bytes) -> bytes:
+        t1 = t2 = t3 = t4 = t5 = t6 = 0xDF26F436
+        words = struct.unpack('>262144I', data[0x1000:0x101000])
+        words2 = struct.unpack('>64I', data[0x750:0x850])
+        for i, d in enumerate(words):
+            if ((t6 + d) & 0xFFFFFFFF) < t6:
+                t4 += 1
+            t6 = (t6 + d) & 0xFFFFFFFF
+            t3 ^= d
+            shift = d & 0x1F
+            r = ((d << shift) | (d >> (32 - shift)))
+            t5 += r
+            if t2 > d:
+                t2 ^= r & 0xFFFFFFFF
+            else:
+                t2 ^= t6 ^ d
+            t1 += words2[i % 64] ^ d
+        return struct.pack('>II', (t6 ^ t4 ^ t3) & 0xFFFFFFFF, (t5 ^ t2 ^ t1) & 0xFFFFFFFF)
+
+    def test_calculate_crc(self):
+        rng = random.Random('TESTCRC')
+        blocks = [random_bytes(rng, 0x101000), bytes(0x101000), b'\xFF' * 0x101000, random_bytes(rng, 0x1000) + bytes(rng.choice((0, 1, 0x1F, 0xFF)) for _ in range(0x100000))]
+        for data in blocks:
+            self.assertEqual(bytes(calculate_crc(BigStream(bytearray(data)))), self.reference_crc(data))
+
+
+class TestBigStream(unittest.TestCase):
+    def test_bulk_reads_and_writes(self):
+        stream = BigStream(bytearray(0x20))
+        stream.write_int16s(0x00, [0x1234, 0xFFFF, 0x10000])
+        stream.write_int24s(None, [0xABCDEF])
+        stream.write_int32s(0x10, [0x89ABCDEF, -1])
+        self.assertEqual(stream.buffer[:0x09].hex(), '1234ffff0000abcdef')
+        self.assertEqual(stream.read_int16s(0x00, 3), (0x1234, 0xFFFF, 0))
+        self.assertEqual(stream.read_int32s(0x10, 2), (0x89ABCDEF, 0xFFFFFFFF))
+        self.assertEqual(stream.read_int16(None), 0)
+        self.assertEqual(stream.read_structs(0x00, '>HB', 2), [(0x1234, 0xFF), (0xFF00, 0x00)])
+        self.assertEqual(stream.last_address, 0x06)
+        stream.write_structs(0x08, '>BH', [(1, 2), (3, 4)])
+        self.assertEqual(stream.read_struct(0x08, '>BHBH'), (1, 2, 3, 4))
+        stream.append_int32s([1, 2])
+        self.assertEqual(stream.read_int32s(0x20, 2), (1, 2))
+
+        # The ROM keeps tracking every changed address.
+        rom = Rom()
+        rom.buffer = bytearray(0x20)
+        rom.write_int32s(0x04, [1, 2])
+        rom.write_int16s(None, [3])
+        self.assertEqual(list(rom.changed_ranges), [(0x04, 0x0E)])
+
+
+class TestRom(unittest.TestCase):
+    def test_address_ranges(self):
+        ranges = AddressRanges([(10, 20)])
+        for start, end in ((30, 40), (18, 25), (25, 26), (50, 50), (5, 8)):
+            ranges.add(start, end)
+        self.assertEqual(list(ranges), [(5, 8), (10, 26), (30, 40)])
+        ranges.remove(12, 35)
+        self.assertEqual(list(ranges), [(5, 8), (10, 12), (35, 40)])
+        self.assertEqual(len(ranges), 10)
+        self.assertIn(11, ranges)
+        self.assertNotIn(12, ranges)
+        self.assertNotIn(40, ranges)
+
+    def test_shared_base_rom(self):
+        if not os.path.isfile('./ZOOTDEC.z64'):
+            self.skipTest("Base ROM file not available.")
+        rom = Rom("./ZOOTDEC.z64")
+        other_rom = Rom("./ZOOTDEC.z64")
+        self.assertIs(rom.original.buffer, other_rom.original.buffer)
+        rom.write_bytes(0x1000, [0xFF] * 0x10)
+        rom.restore()
+        self.assertEqual(rom.buffer, other_rom.buffer)
+
+    def test_xor_key_stream(self):
+        rom = Rom()
+        rom.original = Rom()
+        rom.original.buffer = bytes([0, 5, 0, 0, 7, 9, 0, 3, 0, 8, 0, 0])
+        xor_range = (1, 9)
+        for key_address in range(1, 10):
+            keys = XorKeyStream(rom, xor_range, key_address)
+            keys.skip(3)
+            data = bytes([1, 0, 2, 2, 0, 0, 3, 4, 5, 6, 0])
+            expected = []
+            address = key_address
+            for _ in range(3):
+                key, address = key_next(rom, address, xor_range)
+            for b in data:
+                if b == 0:
+                    expected.append(0)
+                else:
+                    key, address = key_next(rom, address, xor_range)
+                    expected.append(b ^ key)
+            self.assertEqual(keys.xor(data), bytes(expected))
+
+    def test_patch_round_trip(self):
+        rng = random.Random('TESTPATCH')
+        rom = Rom()
+        rom.buffer = bytearray(random_bytes(rng, 0x4000000))
+        rom.original = rom.copy()
+        for _ in range(500):
+            address = rng.randrange(0x10000, 0x3F00000)
+            if rng.random() < 0.5:
+                rom.write_bytes(address, random_bytes(rng, rng.randrange(1, 500)))
+            else:
+                rom.write_bytes(address, rom.original.buffer[address:address + 8])
+                rom.write_byte(address + rng.randrange(8, 16), rng.randrange(256))
+        patch_file = os.path.join(output_dir, 'round_trip.zpf')
+        create_patch_file(rom, patch_file)
+
+        patched = Rom()
+        patched.buffer = bytearray(rom.original.buffer)
+        patched.original = rom.original
+        settings = make_settings_for_test({'patch_file': patch_file, 'repatch_cosmetics': False})
+        apply_patch_file(patched, settings)
+        self.assertEqual(patched.buffer, rom.buffer)
+
+        patched.rescan_changed_bytes()
+        self.assertTrue(all(patched.buffer[start:end] != rom.original.buffer[start:end] for start, end in patched.changed_ranges))
+        self.assertEqual(len(patched.changed_ranges), sum(a != b for a, b in zip(patched.buffer, rom.original.buffer)))
+
+    def test_minibsdiff_patch(self):
+        def int64(value: int) -> bytes:
+            # The sign is stored in the highest bit.
+            return struct.pack('<Q', abs(value) | (1 << 63 if value < 0 else 0))
+        original = bytes(range(0x80, 0xA0))
+        # 10 diff bytes from 0 and 3 extra bytes, 4 diff bytes from 18 and 2 extra bytes, then 13 diff bytes from 17.
+        ctrl = int64(10) + int64(3) + int64(8) + int64(4) + int64(2) + int64(-5) + int64(13) + int64(0) + int64(0)
+        diff = bytes([0, 0x80, 0xFF, 1, 0, 0, 0x90, 0, 0, 2]) + bytes([0x70, 0, 0, 0x81]) + bytes(13)
+        extra = b'abcde'
+        expected = bytearray(original)
+        for i, b in enumerate(diff[:10]):
+            expected[i] = (original[i] + b) & 0xFF
+        expected[10:13] = b'abc'
+        for i, b in enumerate(diff[10:14]):
+            expected[13 + i] = (original[18 + i] + b) & 0xFF
+        expected[17:19] = b'de'
+        expected[19:32] = original[17:30]
+        patch_file = os.path.join(output_dir, 'minibsdiff.patch')
+        with gzip.open(patch_file, 'wb') as stream:
+            stream.write(b'MBSDIF43' + int64(len(ctrl)) + int64(len(diff)) + int64(len(expected)) + ctrl + diff + extra)
+
+        rom = Rom()
+        rom.buffer = bytearray(original)
+        rom.original = Rom()
+        rom.original.buffer = original
+        apply_minibsdiff_patch_file(rom, patch_file)
+        self.assertEqual(rom.buffer, expected)
+        self.assertEqual(list(rom.changed_ranges), [(1, 4), (6, 7), (9, 32)])
+
+    def test_patch_key_collisions(self):
+        # Bytes that match their XOR key split blocks, more than 0xFF matching keys in a row split them
+        # again, and so do 0s at the end of a block section of maximum length.
+        xor_range = (0x100, 0x100 + 300)
+        original = bytearray(0x30000)
+        original[xor_range[0]:xor_range[1] + 1] = bytes([7] * 300 + [9])
+        rom = Rom()
+        rom.buffer = bytearray(original)
+        rom.original = Rom()
+        rom.original.buffer = bytes(original)
+        rom.write_bytes(0x1000, bytes([7, 0, 7, 7, 9, 1, 0, 7]))
+        rom.write_bytes(0x2000, bytes([1]) * 0xFFFE + bytes([0, 0, 1, 7]))
+        patch_file = os.path.join(output_dir, 'key_collisions.zpf')
+        create_patch_file(rom, patch_file, xor_range)
+
+        patched = Rom()
+        patched.buffer = bytearray(original)
+        patched.original = rom.original
+        settings = make_settings_for_test({'patch_file': patch_file, 'repatch_cosmetics': False})
+        apply_patch_file(patched, settings)
+        self.assertEqual(patched.buffer, rom.buffer)
+
+
+class TestPatches(unittest.TestCase):
+    def test_actor_index(self):
+        rom = Rom()
+        rom.buffer = bytearray(0xC00000)
+        # Every scene header only ends, except scene 3, which has a room with 2 actors and a transition actor.
+        rom.write_byte(0x100000, 0x14)
+        for scene in range(0x65):
+            rom.write_int32(0x00B71440 + scene * 0x14, 0x100000)
+        rom.write_int32(0x00B71440 + 3 * 0x14, 0x200000)
+        rom.write_bytes(0x200000, [0x04, 1, 0, 0, 0x02, 0, 0, 0x20, 0x0E, 1, 0, 0, 0x02, 0, 0, 0x30, 0x14])
+        rom.write_int32(0x200020, 0x300000)
+        rom.write_int16(0x200034, 0x0009)
+        rom.write_bytes(0x300000, [0x01, 2, 0, 0, 0x03, 0, 0, 0x10, 0x14])
+        rom.write_int16(0x300010, 0x01C6)
+        rom.write_int16(0x300020, 0x009B)
+
+        def get_actor(rom: Rom, actor_id: int, actor: int, scene: int) -> tuple[int, int]:
+            return actor_id, scene
+
+        self.assertEqual(get_actor_list(rom, get_actor), {0x300010: (0x01C6, 3), 0x300020: (0x009B, 3), 0x200030: (0x0009, 3)})
+        self.assertIs(get_actor_index(rom), get_actor_index(rom))
+        # Changing an actor's params keeps the index, changing an actor id or a header rebuilds it.
+        actor_index = get_actor_index(rom)
+        rom.write_int16(0x300010 + 14, 0x1234)
+        self.assertIs(get_actor_index(rom), actor_index)
+        rom.write_int16(0x300020, 0x0195)
+        self.assertEqual(get_actor_list(rom, get_actor)[0x300020], (0x0195, 3))
+        rom.write_byte(0x300001, 1)
+        self.assertEqual(get_actor_list(rom, get_actor), {0x300010: (0x01C6, 3), 0x200030: (0x0009, 3)})
+
+
+class TestParallelGeneration(unittest.TestCase):
+    def test_parallel_attempts(self):
+        # The first attempts of this seed fail. Racing attempts in parallel has to pick the attempt that generating
+        # them one after another succeeds at, however many of them race at once, and generate the same world.
+        spoilers = []
+        for parallel_attempts in (1, 2, 3):
+            settings = make_settings_for_test({'parallel_attempts': parallel_attempts}, seed='AAA', outfilename='parallel_attempts')
+            main(settings)
+            spoilers.append(load_spoiler(f'{settings.output_file}_Spoiler.json'))
+            if parallel_attempts == 1:
+                retries = instrumentation.counters['generation_retries']
+                self.assertGreater(retries, 0)
+            else:
+                self.assertEqual(instrumentation.counters['generation_retries'], retries)
+                self.assertEqual(spoilers[-1]['locations'], spoilers[0]['locations'])
+
+    def test_parallel_batch(self):
+        settings = make_settings_for_test({}, seed='TESTBATCH')
+        settings.count = 2
+        settings.generation_workers = 2
+        settings.output_file = ''
+        # The file names start with the settings string, so spoilers of earlier settings would be counted in the
+        # output directory of the other tests.
+        with tempfile.TemporaryDirectory() as batch_output_dir:
+            settings.output_dir = batch_output_dir
+            self.assertEqual(main_batch(settings), {})
+            for i in range(2):
+                spoilers = [fn for fn in os.listdir(batch_output_dir) if fn.endswith(f'_TESTBATCH-{i}_Spoiler.json')]
+                self.assertEqual(len(spoilers), 1)
+
+
+class TestServer(unittest.TestCase):
+    def post(self, url: str, content: Any) -> tuple[int, dict[str, Any]]:
+        request = urllib.request.Request(url, data=json.dumps(content).encode('utf-8'), headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as e:
+            return e.code, json.load(e)
+
+    def test_generate(self):
+        with GenerationServer(('127.0.0.1', 0), make_settings_for_test({})) as server:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                url = 'http://%s:%d' % server.server_address[:2]
+                with urllib.request.urlopen(f'{url}/status') as response:
+                    self.assertEqual(json.load(response)['workers'], 1)
+                for seed in ('TESTSERVER1', 'TESTSERVER2'):
+                    status, result = self.post(f'{url}/generate', {
+                        'seed': seed,
+                        'create_spoiler': True,
+                        'create_patch_file': False,
+                        'create_compressed_rom': False,
+                        'create_uncompressed_rom': False,
+                        'create_wad_file': False,
+                    })
+                    self.assertEqual(status, 200, result.get('error'))
+                    self.assertEqual(result['seed'], seed)
+                    self.assertEqual(result['spoiler'][':seed'], seed)
+                    self.assertIn('locations', result['spoiler'])
+                status, result = self.post(f'{url}/generate', {'world_count': 'many'})
+                self.assertEqual(status, 400)
+                self.assertIn('error', result)
+            finally:
+                server.shutdown()
+                thread.join()
+
+
 class TestValidSpoilers(unittest.TestCase):
     # Normalizes spoiler dict for single world or multiple worlds
     # Single world worlds_dict is a map of key -> value
@@ -928,6 +1374,39 @@ class TestValidSpoilers(unittest.TestCase):
                     raise
 
 
+class TestMessages(unittest.TestCase):
+    def test_repack_messages(self):
+        def repacked_rom() -> Rom:
+            rom = Rom()
+            rom.buffer = bytearray(0x1000000)
+            for index, start in enumerate((0x7430, JPN_TEXT_START, ENG_TEXT_START)):
+                rom.write_int32s(0x7430 + 0x10 * index, [start, start + 0x40, start, 0])
+            repack_messages(rom, [message.copy() for message in messages], permutation)
+            return rom
+
+        texts = ["Hello\x04\x08there!", "\x1AFaster\x13\x09text\x0E\x28", "Welcome\x07\x20\x35", "\x81\x40"]
+        messages = [Message.from_string(text, 0x1000 + index, 0x23) for index, text in enumerate(texts)]
+        messages[-1].id = 0xFFFC
+        for index, message in enumerate(messages):
+            message.index = index
+        permutation = [2, 1, 0, 3]
+        rom = repacked_rom()
+
+        offset = 0
+        for old_message, new_index in zip(messages, permutation):
+            new_message = messages[new_index].copy()
+            new_message.id = old_message.id
+            if new_message.id != 0xFFFC:
+                new_message.transform(True, old_message.ending)
+            text = new_message.encode()
+            self.assertEqual(rom.read_bytes(EXTENDED_TABLE_START + 8 * old_message.index, 8), new_message.table_entry(offset, 0x08))
+            self.assertEqual(rom.read_bytes(JPN_TEXT_START + offset, len(text)), text)
+            offset += len(text)
+        self.assertEqual(rom.read_bytes(EXTENDED_TABLE_START + 8 * len(messages), 16), bytes([0xFF, 0xFD, 0, 0, 0x08]) + offset.to_bytes(3, 'big') + bytes([0xFF, 0xFF]) + bytes(6))
+        # Repacking the same messages again uses the transformed text of the first time.
+        self.assertEqual(repacked_rom().buffer, rom.buffer)
+
+
 class TestTextShuffle(unittest.TestCase):
     def test_text_shuffle(self):
         if not os.path.isfile('./ZOOTDEC.z64'):
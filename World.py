@@ -21,12 +21,16 @@ from OcarinaSongs import generate_song_list, Song
 from Plandomizer import WorldDistribution, InvalidFileException
 from Region import Region, TimeOfDay
 from RuleParser import Rule_AST_Transformer
+from RulesCommon import RuleIndex
 from Settings import Settings
 from SettingsList import SettingInfos, get_settings_from_section
 from Spoiler import Spoiler
 from State import State
 from Utils import data_path, read_logic_file
 
+# Region files by path. They are only read, so every world and generation attempt shares them.
+logic_file_cache: dict[str, list[dict[str, Any]]] = {}
+
 
 class World:
     def __init__(self, world_id: int, settings: Settings, resolve_randomized_settings: bool = True) -> None:
@@ -35,6 +39,7 @@ class World:
         self.regions: list[Region] = []
         self.itempool: list[Item] = []
         self._cached_locations: list[Location] = []
+        self._rule_index: Optional[RuleIndex] = None
         self._entrance_cache: dict[str, Entrance] = {}
         self._region_cache: dict[str, Region] = {}
         self._location_cache: dict[str, Location] = {}
@@ -647,7 +652,9 @@ class World:
             self.settings.silver_rupee_pouches = self.silver_rupee_puzzles()
 
     def load_regions_from_json(self, file_path: str) -> list[tuple[Entrance, str]]:
-        region_json = read_logic_file(file_path)
+        if file_path not in logic_file_cache:
+            logic_file_cache[file_path] = read_logic_file(file_path)
+        region_json = logic_file_cache[file_path]
         savewarps_to_connect = []
 
         for region in region_json:
@@ -1328,6 +1335,17 @@ class World:
     def get_entrances(self) -> list[Entrance]:
         return [exit for region in self.regions for exit in region.exits]
 
+    # Returns the index of the access rules of this world's locations and exits.
+    # Location.set_rule/add_rule and Entrance.set_rule/add_rule clear it, as does anything
+    # else that adds or removes locations or exits once the world has been built.
+    def get_rule_index(self) -> RuleIndex:
+        if self._rule_index is None:
+            self._rule_index = RuleIndex([location for region in self.regions for location in region.locations], self.get_entrances())
+        return self._rule_index
+
+    def clear_rule_index(self) -> None:
+        self._rule_index = None
+
     def get_shufflable_entrances(self, type=None, only_primary=False) -> list[Entrance]:
         return [entrance for entrance in self.get_entrances() if (type is None or entrance.type == type) and (not only_primary or entrance.primary)]
 
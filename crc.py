@@ -1,38 +1,50 @@
-import itertools
+import struct
+from itertools import accumulate
 
 from ntype import uint32, BigStream
 
+U32: int = 0xFFFFFFFF
+SEED: int = 0xDF26F436
+WORDS: struct.Struct = struct.Struct('>262144I')
 
-def calculate_crc(data: BigStream) -> bytearray:
-    t1 = t2 = t3 = t4 = t5 = t6 = 0xDF26F436
-
-    u32 = 0xFFFFFFFF
-
-    m1 = data.read_bytes(0x1000, 0x100000)
-    words = map(uint32.value, zip(m1[0::4], m1[1::4], m1[2::4], m1[3::4]))
 
-    m2 = data.read_bytes(0x750, 0x100)
-    words2 = map(uint32.value, zip(m2[0::4], m2[1::4], m2[2::4], m2[3::4]))
+# XORs together the 32-bit words of a block whose number of words is a power of two,
+# by folding its halves onto each other.
+def xor_words(block: bytes) -> int:
+    value = int.from_bytes(block, 'big')
+    bits = len(block) * 8
+    while bits > 32:
+        bits //= 2
+        value = (value >> bits) ^ (value & ((1 << bits) - 1))
+    return value
 
-    for d, d2 in zip(words, itertools.cycle(words2)):
-        # keep t2 and t6 in u32 for comparisons; others can wait to be truncated
-        if ((t6 + d) & u32) < t6:
-            t4 += 1
 
-        t6 = (t6+d) & u32
-        t3 ^= d
+def calculate_crc(data: BigStream) -> bytearray:
+    m1 = bytes(data.read_bytes(0x1000, 0x100000))
+    m2 = bytes(data.read_bytes(0x750, 0x100))
+    words = WORDS.unpack(m1)
+
+    # Only t2 depends on the order of the words, everything else is computed over the whole block:
+    # t6 is the sum of the words, t4 counts the times the sum overflowed, t3 is the XOR of the words
+    # and t1 is the sum of the words XORed with those of m2 repeated.
+    total = SEED + sum(words)
+    t6 = total & U32
+    t4 = SEED + (total >> 32)
+    t3 = SEED ^ xor_words(m1)
+    t1 = SEED + sum(WORDS.unpack((int.from_bytes(m1, 'big') ^ int.from_bytes(m2 * 0x1000, 'big')).to_bytes(0x100000, 'big')))
+
+    t2 = t5 = SEED
+    for d, s in zip(words, accumulate(words, initial=SEED)):
         shift = d & 0x1F
-        r = ((d << shift) | (d >> (32 - shift)))
+        r = ((d << shift) | (d >> (32 - shift))) & U32
         t5 += r
-
         if t2 > d:
-            t2 ^= r & u32
+            t2 ^= r
         else:
-            t2 ^= t6 ^ d
-
-        t1 += d2 ^ d
+            # s is the sum before adding d.
+            t2 ^= ((s + d) & U32) ^ d
 
-    crc0 = (t6 ^ t4 ^ t3) & u32
-    crc1 = (t5 ^ t2 ^ t1) & u32
+    crc0 = (t6 ^ t4 ^ t3) & U32
+    crc1 = (t5 ^ t2 ^ t1) & U32
 
     return uint32.bytes(crc0) + uint32.bytes(crc1)
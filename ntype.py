@@ -1,7 +1,7 @@
 # Originally written by mzxrules
 from __future__ import annotations
-from collections.abc import Sequence
-from typing import Optional
+from collections.abc import Iterable, Sequence
+from typing import Any, Optional
 import struct
 
 
@@ -121,7 +121,8 @@ class BigStream:
     def read_int16(self, address: Optional[int] = None) -> int:
         if address is None:
             address = self.last_address
-        return uint16.value(self.read_bytes(address, 2))
+        self.last_address = address + 2
+        return uint16._struct.unpack_from(self.buffer, address)[0]
 
     def read_int24(self, address: Optional[int] = None) -> int:
         if address is None:
@@ -131,7 +132,31 @@ class BigStream:
     def read_int32(self, address: Optional[int] = None) -> int:
         if address is None:
             address = self.last_address
-        return uint32.value(self.read_bytes(address, 4))
+        self.last_address = address + 4
+        return uint32._struct.unpack_from(self.buffer, address)[0]
+
+    def read_int16s(self, address: Optional[int], count: int) -> tuple[int, ...]:
+        return self.read_struct(address, f'>{count}H')
+
+    def read_int32s(self, address: Optional[int], count: int) -> tuple[int, ...]:
+        return self.read_struct(address, f'>{count}I')
+
+    # Reads the values of a struct format string, like '>HHI'.
+    def read_struct(self, address: Optional[int], format: str | struct.Struct) -> tuple:
+        if address is None:
+            address = self.last_address
+        if not isinstance(format, struct.Struct):
+            format = struct.Struct(format)
+        self.last_address = address + format.size
+        return format.unpack_from(self.buffer, address)
+
+    # Reads an array of count records of a struct format string, like the entries of a table.
+    def read_structs(self, address: Optional[int], format: str | struct.Struct, count: int) -> list[tuple]:
+        if address is None:
+            address = self.last_address
+        if not isinstance(format, struct.Struct):
+            format = struct.Struct(format)
+        return list(format.iter_unpack(self.read_bytes(address, format.size * count)))
 
     def write_byte(self, address: Optional[int], value: int) -> None:
         if address is None:
@@ -171,31 +196,25 @@ class BigStream:
         self.buffer[address:address + len(values)] = values
 
     def write_int16s(self, address: Optional[int], values: Sequence[int]) -> None:
-        if address is None:
-            address = self.last_address
-
-        i: int
-        value: int
-        for i, value in enumerate(values):
-            self.write_int16(address + (i * 2), value)
+        self.write_bytes(address, struct.pack(f'>{len(values)}H', *(value & 0xFFFF for value in values)))
 
     def write_int24s(self, address: Optional[int], values: Sequence[int]) -> None:
-        if address is None:
-            address = self.last_address
-
-        i: int
-        value: int
-        for i, value in enumerate(values):
-            self.write_int24(address + (i * 3), value)
+        self.write_bytes(address, b''.join(uint24.bytes(value) for value in values))
 
     def write_int32s(self, address: Optional[int], values: Sequence[int]) -> None:
-        if address is None:
-            address = self.last_address
+        self.write_bytes(address, struct.pack(f'>{len(values)}I', *(value & 0xFFFFFFFF for value in values)))
+
+    # Writes the values of a struct format string, like '>HHI'.
+    def write_struct(self, address: Optional[int], format: str | struct.Struct, *values: Any) -> None:
+        if not isinstance(format, struct.Struct):
+            format = struct.Struct(format)
+        self.write_bytes(address, format.pack(*values))
 
-        i: int
-        value: int
-        for i, value in enumerate(values):
-            self.write_int32(address + (i * 4), value)
+    # Writes an array of records of a struct format string, like the entries of a table.
+    def write_structs(self, address: Optional[int], format: str | struct.Struct, records: Iterable[Sequence[Any]]) -> None:
+        if not isinstance(format, struct.Struct):
+            format = struct.Struct(format)
+        self.write_bytes(address, b''.join(format.pack(*record) for record in records))
 
     def append_byte(self, value: int) -> None:
         self.buffer.append(value)
@@ -216,21 +235,13 @@ class BigStream:
         self.append_bytes(struct.pack('>f', value))
 
     def append_bytes(self, values: Sequence[int]) -> None:
-        value: int
-        for value in values:
-            self.append_byte(value)
+        self.buffer.extend(values)
 
     def append_int16s(self, values: Sequence[int]) -> None:
-        value: int
-        for value in values:
-            self.append_int16(value)
+        self.append_bytes(struct.pack(f'>{len(values)}H', *(value & 0xFFFF for value in values)))
 
     def append_int24s(self, values: Sequence[int]) -> None:
-        value: int
-        for value in values:
-            self.append_int24(value)
+        self.append_bytes(b''.join(uint24.bytes(value) for value in values))
 
     def append_int32s(self, values: Sequence[int]) -> None:
-        value: int
-        for value in values:
-            self.append_int32(value)
+        self.append_bytes(struct.pack(f'>{len(values)}I', *(value & 0xFFFFFFFF for value in values)))